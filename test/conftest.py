@@ -1,3 +1,5 @@
+import jaxtyping
+import pytest
 import torch
 import warnings
 
@@ -5,3 +7,12 @@ import warnings
 with warnings.catch_warnings():
     warnings.simplefilter("ignore")
     torch.rand(2, names=("a",))
+
+
+@pytest.fixture(autouse=True)
+def reset_options():
+    # Every test starts from the default options, without any deferred checks left
+    # over from the test before it.
+    yield
+    jaxtyping.sync_checks()
+    jaxtyping.reset_options()
@@ -0,0 +1,93 @@
+import asyncio
+from typing import AsyncGenerator, AsyncIterator, Tuple
+
+import pytest
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def test_coroutine():
+    @typechecked
+    async def func(
+        x: TensorType["dim1"], size: int
+    ) -> Tuple[TensorType["dim1"], TensorType["dim2"]]:
+        await asyncio.sleep(0)
+        return x, torch.rand(size)
+
+    async def main():
+        out = await func(torch.rand(3), 2)
+        assert out[0].shape == (3,)
+        with pytest.raises(TypeError):
+            await func(torch.rand(3), "2")
+
+    asyncio.run(main())
+
+    @typechecked
+    async def bad(x: TensorType["dim1"]) -> TensorType["dim1"]:
+        await asyncio.sleep(0)
+        return torch.rand(4)
+
+    with pytest.raises(TypeError):
+        asyncio.run(bad(torch.rand(3)))
+
+
+def test_async_generator():
+    @typechecked
+    async def func(
+        x: TensorType["dim1"], sizes: list
+    ) -> AsyncIterator[TensorType["dim1", "dim2"]]:
+        for size in sizes:
+            await asyncio.sleep(0)
+            yield torch.rand(x.shape[0], size)
+
+    async def collect(sizes, dim1_size=3):
+        return [out async for out in func(torch.rand(dim1_size), sizes)]
+
+    # `dim2` may differ between yields, but `dim1` is bound by the argument.
+    assert [out.shape for out in asyncio.run(collect([1, 2, 3]))] == [
+        (3, 1),
+        (3, 2),
+        (3, 3),
+    ]
+
+    @typechecked
+    async def bad(x: TensorType["dim1"]) -> AsyncIterator[TensorType["dim1"]]:
+        yield torch.rand(3)
+        yield torch.rand(4)
+
+    async def collect_bad():
+        out = []
+        with pytest.raises(TypeError, match="dim1"):
+            async for item in bad(torch.rand(3)):
+                out.append(item)
+        return out
+
+    assert len(asyncio.run(collect_bad())) == 1
+
+
+def test_async_generator_send():
+    @typechecked
+    async def func(
+        x: TensorType["dim1"],
+    ) -> AsyncGenerator[TensorType["dim1"], TensorType["dim1"]]:
+        y = x
+        while True:
+            y = yield y
+
+    async def main():
+        gen = func(torch.rand(3))
+        assert (await gen.asend(None)).shape == (3,)
+        assert (await gen.asend(torch.rand(3))).shape == (3,)
+        with pytest.raises(TypeError):
+            await gen.asend(torch.rand(4))
+        await gen.aclose()
+
+    asyncio.run(main())
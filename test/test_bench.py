@@ -0,0 +1,60 @@
+import json
+
+from jaxtyping import bench
+
+
+def test_bench_quick():
+    results = bench.run(quick=True, select="args=4")
+    assert set(results["results"]) == {
+        "args=4",
+        "checked,args=4",
+        "typed_jit_trace,args=4",
+    }
+    for result in results["results"].values():
+        assert result["checked_ns"] > 0
+        assert result["baseline_ns"] > 0
+    # Round trips through JSON.
+    assert json.loads(json.dumps(results)) == results
+
+
+def test_bench_compare():
+    def results(**overheads):
+        return {
+            "results": {
+                name: {"overhead_ns": overhead} for name, overhead in overheads.items()
+            }
+        }
+
+    baseline = results(a=1000.0, b=1000.0, c=10.0, d=-50.0, e=1000.0)
+    current = results(a=1100.0, b=2000.0, c=100.0, d=500.0, f=5000.0)
+    regressions = bench.compare(baseline, current)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("b:")
+    assert regressions[1].startswith("d:")
+    assert bench.compare(baseline, current, tolerance=2.0) == [regressions[1]]
+
+
+def test_bench_main(tmp_path, capsys):
+    output = tmp_path / "results.json"
+    assert bench.main(["--quick", "-k", "fixed_dims", "--output", str(output)]) == 0
+    baseline = json.loads(output.read_text())
+    # Nothing can regress against an impossibly slow baseline.
+    baseline["results"]["fixed_dims"]["overhead_ns"] = 1e12
+    output.write_text(json.dumps(baseline))
+    assert bench.main(["--quick", "-k", "fixed_dims", "--compare", str(output)]) == 0
+    assert "No regressions." in capsys.readouterr().out
+
+
+def test_bench_threaded():
+    results = bench.run_threaded([1, 2], calls=10)
+    assert set(results["threads"]) == {"1", "2"}
+    assert results["threads"]["1"]["speedup"] == 1
+    assert results["threads"]["2"]["calls_per_second"] > 0
+
+
+def test_bench_import():
+    results = bench.run_import(10, repeat=1)
+    assert set(results) == {"none", "typechecked", "checked"}
+    for result in results.values():
+        assert result["import_ms"] > 0
+        assert result["first_call_ms"] > 0
@@ -0,0 +1,192 @@
+import functools
+from typing import Iterator, List
+
+import pytest
+import jaxtyping
+from jaxtyping import checked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = dim3 = None
+
+
+@checked
+def _matmul(
+    x: TensorType["dim1", "dim2"], y: TensorType["dim2", "dim3"]
+) -> TensorType["dim1", "dim3"]:
+    return x @ y
+
+
+def test_checked():
+    assert _matmul(torch.rand(2, 3), torch.rand(3, 4)).shape == (2, 4)
+    assert _matmul(torch.rand(2, 3), y=torch.rand(3, 4)).shape == (2, 4)
+    assert _matmul(y=torch.rand(3, 4), x=torch.rand(2, 3)).shape == (2, 4)
+    with pytest.raises(TypeError, match="dim2"):
+        _matmul(torch.rand(2, 3), torch.rand(4, 4))
+    with pytest.raises(TypeError, match="dim2"):
+        _matmul(torch.rand(2, 3), y=torch.rand(4, 4))
+    with pytest.raises(TypeError):
+        _matmul(torch.rand(2, 3), 1)
+    with pytest.raises(TypeError):
+        _matmul(torch.rand(2, 3))
+    with pytest.raises(TypeError):
+        _matmul(torch.rand(2, 3), torch.rand(3, 4), z=1)
+    assert _matmul.__name__ == "_matmul"
+
+
+def test_checked_return():
+    @checked
+    def func(x: TensorType["dim1"], n: int) -> TensorType["dim1"]:
+        return torch.rand(n)
+
+    func(torch.rand(3), 3)
+    with pytest.raises(TypeError, match="dim1"):
+        func(torch.rand(3), 4)
+
+
+def test_checked_plain_arguments():
+    @checked
+    def func(x: TensorType["dim1"], n: int, name: str = None, *rest: int) -> int:
+        return n
+
+    func(torch.rand(3), 1)
+    func(torch.rand(3), 1, None, 2, 3)
+    func(torch.rand(3), n=1, name="a")
+    with pytest.raises(TypeError, match='type of argument "n" must be int'):
+        func(torch.rand(3), "1")
+    with pytest.raises(TypeError, match="rest"):
+        func(torch.rand(3), 1, "a", 2, "3")
+
+    @checked
+    def plain_return(x: TensorType["dim1"]) -> int:
+        return "not an int"
+
+    with pytest.raises(TypeError, match="the return value"):
+        plain_return(torch.rand(3))
+
+    @checked
+    def bad_return(x: TensorType["dim1"]) -> List[TensorType["dim1"]]:
+        return [x, x[:1]]
+
+    with pytest.raises(TypeError):
+        bad_return(torch.rand(3))
+
+
+def test_checked_method():
+    class A:
+        @checked
+        def method(self, x: TensorType["dim1"]) -> TensorType["dim1"]:
+            return x
+
+    A().method(torch.rand(3))
+    with pytest.raises(TypeError):
+        A().method(3)
+
+
+def test_checked_options():
+    @checked
+    @jaxtyping.options(check_every=2)
+    def func(x: TensorType["dim1"], y: TensorType["dim1"]):
+        pass
+
+    func(torch.rand(2), torch.rand(2))
+    func(torch.rand(2), torch.rand(2))
+    assert jaxtyping.check_counts(func) == {"checked": 1, "skipped": 1}
+
+
+def test_checked_generator():
+    @checked
+    def gen(x: TensorType["dim1"]) -> Iterator[TensorType["dim1"]]:
+        yield x
+        yield torch.rand(x.shape[0] + 1)
+
+    items = gen(torch.rand(2))
+    next(items)
+    with pytest.raises(TypeError):
+        next(items)
+
+
+# Nothing is looked up until the first call, so annotations can refer to names defined
+# after the function.
+@checked
+def _lazy(x: "_Later") -> TensorType["dim1"]:
+    return x.value
+
+
+class _Later:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_checked_lazy():
+    _lazy(_Later(torch.rand(3)))
+    with pytest.raises(TypeError):
+        _lazy(torch.rand(3))
+
+
+def test_checked_signature():
+    @checked
+    def func(
+        x: TensorType["dim1"], y: int = 0, *args: int, z: TensorType["dim1"], **kwargs
+    ) -> int:
+        return y
+
+    func(torch.rand(2), z=torch.rand(2))
+    func(torch.rand(2), 1, 2, 3, z=torch.rand(2), w=4)
+    with pytest.raises(TypeError, match="dim1"):
+        func(torch.rand(2), z=torch.rand(3))
+    with pytest.raises(TypeError, match="args"):
+        func(torch.rand(2), 1, "2", z=torch.rand(2))
+
+
+def test_checked_partial():
+    def func(x: TensorType["dim1"], y: TensorType["dim1"]):
+        pass
+
+    # Like typeguard.typechecked, objects without any code aren't checked.
+    partial = functools.partial(func, torch.rand(2))
+    with pytest.warns(UserWarning, match="not typechecking"):
+        assert checked(partial) is partial
+    partial(torch.rand(3))
+
+
+@checked
+class _Checked:
+    def method(self, x: TensorType["dim1"]) -> TensorType["dim1"]:
+        return x
+
+    @staticmethod
+    def static(x: TensorType["dim1"], y: TensorType["dim1"]):
+        pass
+
+    @classmethod
+    def cls(cls, x: TensorType["dim1"], y: TensorType["dim1"]):
+        pass
+
+    @property
+    def prop(self) -> TensorType[3]:
+        return torch.rand(2)
+
+    def unannotated(self, x):
+        return x
+
+
+def test_checked_class():
+    obj = _Checked()
+    obj.method(torch.rand(2))
+    with pytest.raises(TypeError):
+        obj.method(3)
+    _Checked.static(torch.rand(2), torch.rand(2))
+    with pytest.raises(TypeError, match="dim1"):
+        _Checked.static(torch.rand(2), torch.rand(3))
+    with pytest.raises(TypeError, match="dim1"):
+        obj.cls(torch.rand(2), torch.rand(3))
+    with pytest.raises(TypeError, match="return value"):
+        obj.prop
+    assert obj.unannotated(3) == 3
+    assert not hasattr(_Checked.unannotated, "__wrapped__")
@@ -0,0 +1,91 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pytest
+from jaxtyping import TensorDetail
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def test_list():
+    @typechecked
+    def func(xs: List[TensorType["dim1", 3]], y: TensorType["dim1"]):
+        pass
+
+    func([torch.rand(2, 3)] * 100, torch.rand(2))
+    func([], torch.rand(2))
+    with pytest.raises(TypeError, match="dim1"):
+        func([torch.rand(2, 3)] * 100 + [torch.rand(4, 3)], torch.rand(2))
+    with pytest.raises(TypeError, match=r"\"xs\"\[100\]"):
+        func([torch.rand(2, 3)] * 100 + [torch.rand(2, 4)], torch.rand(2))
+    with pytest.raises(TypeError, match=r"\"xs\"\[1\]"):
+        func([torch.rand(2, 3), 1.0], torch.rand(2))
+    with pytest.raises(TypeError, match="must be a list"):
+        func((torch.rand(2, 3),), torch.rand(2))
+
+
+def test_tuple_and_sequence():
+    @typechecked
+    def func(
+        xs: Tuple[TensorType["dim1", "dim2"], ...],
+        ys: Sequence[TensorType["dim2", float]],
+    ):
+        pass
+
+    func((torch.rand(2, 3), torch.rand(2, 3)), [torch.rand(3)])
+    with pytest.raises(TypeError):
+        func((torch.rand(2, 3), torch.rand(2, 4)), [torch.rand(3)])
+    with pytest.raises(TypeError):
+        func((torch.rand(2, 3),), [torch.rand(4)])
+    with pytest.raises(TypeError):
+        func((torch.rand(2, 3),), [torch.rand(3).astype(int)])
+    with pytest.raises(TypeError, match="must be a tuple"):
+        func([torch.rand(2, 3)], [torch.rand(3)])
+
+
+def test_nested_containers():
+    @typechecked
+    def func(
+        xs: Optional[List[TensorType["dim1"]]], ys: Dict[str, List[TensorType["dim1"]]]
+    ):
+        pass
+
+    func(None, {"a": [torch.rand(2)] * 10, "b": []})
+    func([torch.rand(2)], {"a": [torch.rand(2)] * 10})
+    with pytest.raises(TypeError):
+        func([torch.rand(2)], {"a": [torch.rand(2)] * 10 + [torch.rand(3)]})
+
+
+class CountingDetail(TensorDetail):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def check(self, array) -> bool:
+        self.count += 1
+        return True
+
+    def __repr__(self) -> str:
+        return "CountingDetail"
+
+    @classmethod
+    def tensor_repr(cls, array) -> str:
+        return ""
+
+
+def test_custom_details_check_every_element():
+    detail = CountingDetail()
+
+    @typechecked
+    def func(xs: List[TensorType["dim1", detail]]):
+        pass
+
+    func([torch.rand(2)] * 10)
+    assert detail.count == 10
@@ -0,0 +1,112 @@
+import pytest
+import jaxtyping
+from jaxtyping import TensorDetail
+from jaxtyping.typechecker import _plans
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def test_deferred_arguments():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: TensorType["dim1", 3], y: TensorType["dim1"]):
+        pass
+
+    func(torch.rand(2, 3), torch.rand(2))
+    jaxtyping.sync_checks()
+    # The mismatch isn't raised by the call itself...
+    func(torch.rand(2, 3), torch.rand(4))
+    with pytest.raises(TypeError, match="earlier call to .*func"):
+        jaxtyping.sync_checks()
+    # ...and is only raised once.
+    jaxtyping.sync_checks()
+    func(torch.rand(2, 4), torch.rand(2))
+    with pytest.raises(TypeError, match="must be of type"):
+        jaxtyping.sync_checks()
+
+
+def test_deferred_raised_at_next_call():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: TensorType["dim1", 3]):
+        pass
+
+    func(torch.rand(2, 2))
+    jaxtyping.typechecker._deferred_queue.join()
+    with pytest.raises(TypeError, match="deferred check"):
+        func(torch.rand(2, 3))
+    func(torch.rand(2, 3))
+    jaxtyping.sync_checks()
+
+
+def test_deferred_return():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: TensorType["dim1"], n: int) -> TensorType["dim1"]:
+        return torch.rand(n)
+
+    func(torch.rand(3), 3)
+    jaxtyping.sync_checks()
+    func(torch.rand(3), 4)
+    with pytest.raises(TypeError, match="inconsistent size"):
+        jaxtyping.sync_checks()
+
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func2(x: TensorType["dim1"]) -> TensorType["dim1"]:
+        return []
+
+    func2(torch.rand(3))
+    with pytest.raises(TypeError, match="return value"):
+        jaxtyping.sync_checks()
+
+
+def test_deferred_plain_arguments():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: TensorType["dim1"], n: int):
+        pass
+
+    # Arguments without arrays are still checked straight away.
+    with pytest.raises(TypeError):
+        func(torch.rand(3), "not an int")
+    with pytest.raises(TypeError):
+        func(3, 3)
+        jaxtyping.sync_checks()
+
+
+class AnyDetail(TensorDetail):
+    def check(self, array) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return "AnyDetail"
+
+    @classmethod
+    def tensor_repr(cls, array) -> str:
+        return ""
+
+
+def test_deferred_not_applicable():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: TensorType["dim1", AnyDetail()], y: TensorType["dim1"]):
+        pass
+
+    # A custom detail might need the array itself, so this is checked immediately.
+    with pytest.raises(TypeError):
+        func(torch.rand(2), torch.rand(3))
+    assert not _plans[func.__wrapped__].deferred
+
+
+def test_deferred_option():
+    with pytest.raises(ValueError):
+        jaxtyping.set_options(deferred=1)
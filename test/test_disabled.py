@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+
+# Run in a subprocess, as JAXTYPING_DISABLE is only read when jaxtyping is imported.
+_script = textwrap.dedent(
+    """
+    import timeit
+    import jax.numpy as jnp
+    import jaxtyping
+    from jaxtyping import JaxArray, patch_typeguard, typed_jit
+
+    patch_typeguard()
+    import typeguard
+
+    assert JaxArray["batch", 3, float] is JaxArray
+    assert JaxArray[()] is JaxArray
+
+    def func(x: JaxArray["batch"], y: JaxArray["batch"]) -> JaxArray["batch"]:
+        return x
+
+    assert typeguard.typechecked(func) is func
+    assert typeguard.typechecked()(func) is func
+    # Mismatched shapes are not checked.
+    typed_jit(func)(jnp.zeros(2), jnp.zeros(3))
+
+    @typeguard.typechecked
+    def decorated(x: JaxArray["batch"], y: JaxArray["batch"]) -> JaxArray["batch"]:
+        return x
+
+    def undecorated(x, y):
+        return x
+
+    # Overhead benchmark. The decorated function is the original function, not a
+    # wrapper around it, so the cost of calling it is identical to an undecorated
+    # function.
+    assert not hasattr(decorated, "__wrapped__")
+    x = jnp.zeros(2)
+    number = 100000
+    decorated_time = min(
+        timeit.repeat(lambda: decorated(x, x), number=number, repeat=5)
+    )
+    undecorated_time = min(
+        timeit.repeat(lambda: undecorated(x, x), number=number, repeat=5)
+    )
+    print(f"decorated: {decorated_time / number * 1e9:.1f}ns per call")
+    print(f"undecorated: {undecorated_time / number * 1e9:.1f}ns per call")
+    """
+)
+
+
+def test_disabled():
+    env = dict(os.environ, JAXTYPING_DISABLE="1")
+    result = subprocess.run(
+        [sys.executable, "-c", _script], env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    print(result.stdout)
@@ -168,3 +168,71 @@ def test_ambiguous_ellipsis():
 
     with pytest.raises(TypeError):
         func2(torch.rand(2, 2))
+
+
+def test_chained_ellipsis():
+    @typechecked
+    def func(
+        w: TensorType["dim1":..., "dim2":...],
+        x: TensorType["dim2":..., "dim3":...],
+        y: TensorType["dim3":..., "dim3":...],
+        z: TensorType["dim3":..., 2],
+        out,
+    ) -> TensorType["dim1":..., "dim3":...]:
+        return out
+
+    func(
+        torch.rand(1, 3, 4),
+        torch.rand(3, 4, 5),
+        torch.rand(5, 5),
+        torch.rand(5, 2),
+        torch.rand(1, 5),
+    )
+    func(
+        torch.rand(3, 4),
+        torch.rand(3, 4),
+        torch.rand(()),
+        torch.rand(2),
+        torch.rand(()),
+    )
+    with pytest.raises(TypeError):
+        func(
+            torch.rand(1, 3, 4),
+            torch.rand(3, 4, 5),
+            torch.rand(5, 5),
+            torch.rand(5, 2),
+            torch.rand(5),
+        )
+    with pytest.raises(TypeError):
+        func(
+            torch.rand(1, 3),
+            torch.rand(3, 4, 5),
+            torch.rand(5, 5),
+            torch.rand(5, 2),
+            torch.rand(1, 5),
+        )
+    with pytest.raises(TypeError):
+        func(
+            torch.rand(1, 3, 4),
+            torch.rand(3, 4, 5),
+            torch.rand(5, 6),
+            torch.rand(5, 2),
+            torch.rand(1, 5),
+        )
+    with pytest.raises(TypeError):
+        func(
+            torch.rand(1, 3, 4),
+            torch.rand(3, 4, 5),
+            torch.rand(5, 5),
+            torch.rand(2),
+            torch.rand(1, 5),
+        )
+
+
+def test_unresolved_ellipsis_message():
+    @typechecked
+    def func(x: TensorType["dim1":..., "dim2":...], y: TensorType[..., "dim2":...]):
+        pass
+
+    with pytest.raises(TypeError, match="dim1"):
+        func(torch.rand(2, 2), torch.rand(2, 2))
@@ -0,0 +1,128 @@
+import asyncio
+from typing import AsyncIterator, Generator, Iterator, Optional
+
+import pytest
+import jaxtyping
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+batch = seq = channels = None
+
+
+def _loader(**options):
+    @typechecked
+    @jaxtyping.options(**options)
+    def loader(
+        channels: TensorType["channels"], shapes: list
+    ) -> Iterator[TensorType["batch", "seq", "channels"]]:
+        for shape in shapes:
+            yield torch.rand(*shape)
+
+    return loader
+
+
+def test_independent():
+    loader = _loader()
+    c = torch.rand(4)
+    assert len(list(loader(c, [(2, 3, 4), (5, 6, 4)]))) == 2
+    with pytest.raises(TypeError, match="channels"):
+        list(loader(c, [(2, 3, 4), (2, 3, 5)]))
+
+
+def test_stream():
+    loader = _loader(yield_dims="stream")
+    c = torch.rand(4)
+    assert len(list(loader(c, [(2, 3, 4)] * 3))) == 3
+    items = []
+    with pytest.raises(TypeError, match="seq"):
+        for item in loader(c, [(2, 3, 4), (2, 3, 4), (2, 5, 4)]):
+            items.append(item)
+    assert len(items) == 2
+    with pytest.raises(TypeError):
+        list(loader(c, [(2, 3, 4), (2, 3, 5)]))
+
+
+def test_per_yield_dims():
+    loader = _loader(yield_dims="stream", per_yield_dims=("seq",))
+    c = torch.rand(4)
+    assert len(list(loader(c, [(2, 3, 4), (2, 5, 4), (2, 1, 4)]))) == 3
+    with pytest.raises(TypeError, match="batch"):
+        list(loader(c, [(2, 3, 4), (3, 3, 4)]))
+    # Argument bindings still apply.
+    with pytest.raises(TypeError, match="channels"):
+        list(loader(c, [(2, 3, 4), (2, 3, 5)]))
+
+
+def test_check_yield_every():
+    loader = _loader(yield_dims="stream", check_yield_every=3)
+    c = torch.rand(4)
+    good = (2, 3, 4)
+    bad = (2, 5, 4)
+    # Only the 1st, 4th, 7th, ... items are checked.
+    assert len(list(loader(c, [good, bad, bad, good, bad, bad, good]))) == 7
+    with pytest.raises(TypeError):
+        list(loader(c, [good, bad, bad, bad]))
+
+
+def test_send_and_return():
+    @typechecked
+    @jaxtyping.options(yield_dims="stream")
+    def accumulate(
+        x: TensorType["channels"],
+    ) -> Generator[
+        TensorType["batch"], Optional[TensorType["batch"]], TensorType["channels"]
+    ]:
+        total = None
+        while True:
+            item = yield torch.rand(2)
+            if item is None:
+                return x if total is None else total
+            total = item
+
+    gen = accumulate(torch.rand(4))
+    next(gen)
+    gen.send(torch.rand(2))
+    with pytest.raises(TypeError, match="batch"):
+        gen.send(torch.rand(3))
+
+    gen = accumulate(torch.rand(4))
+    next(gen)
+    with pytest.raises(StopIteration):
+        gen.send(None)
+
+    gen = accumulate(torch.rand(3))
+    next(gen)
+    gen.send(torch.rand(2))
+    with pytest.raises(TypeError, match="channels"):
+        gen.send(None)
+
+
+def test_async_stream():
+    @typechecked
+    @jaxtyping.options(yield_dims="stream")
+    async def loader(shapes: list) -> AsyncIterator[TensorType["batch", "seq"]]:
+        for shape in shapes:
+            await asyncio.sleep(0)
+            yield torch.rand(*shape)
+
+    async def collect(shapes):
+        return [item async for item in loader(shapes)]
+
+    assert len(asyncio.run(collect([(2, 3)] * 3))) == 3
+    with pytest.raises(TypeError):
+        asyncio.run(collect([(2, 3), (2, 4)]))
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        jaxtyping.options(yield_dims="consistent")
+    with pytest.raises(ValueError):
+        jaxtyping.options(per_yield_dims="seq")
+    with pytest.raises(ValueError):
+        jaxtyping.options(check_yield_every=0)
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+# Run in a subprocess, as what's been imported depends on everything else that the
+# process has done.
+_script = textwrap.dedent("""
+    import sys
+
+    import jaxtyping
+
+    # Importing jaxtyping doesn't import JAX.
+    assert "jax" not in sys.modules, "jax"
+    assert isinstance(jaxtyping.DtypeDetail, type)
+
+    # Nor does creating annotations, or looking up the rest of the API, initialise a
+    # JAX backend.
+    from jaxtyping import JaxArray
+    from jax._src import xla_bridge
+
+    annotation = JaxArray["batch", 3, float]
+    jaxtyping.checked, jaxtyping.PyTree, jaxtyping.tracing, jaxtyping.typed_jit
+    assert not xla_bridge._backends, list(xla_bridge._backends)
+
+    # The default float dtype is only resolved once it's needed.
+    import jax.numpy as jnp
+    from jaxtyping.tensor_details import DtypeDetail
+
+    (detail,) = [
+        d for d in annotation.__metadata__[0]["details"] if isinstance(d, DtypeDetail)
+    ]
+    assert detail.dtype == jnp.ones(()).dtype
+    """)
+
+
+def test_import_is_lazy():
+    result = subprocess.run(
+        [sys.executable, "-c", _script], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_lazy_attributes():
+    import jaxtyping
+
+    assert "checked" in dir(jaxtyping)
+    assert jaxtyping.checked is jaxtyping.typechecker.checked
+    assert jaxtyping.JaxArray is jaxtyping.tensor_type.JaxArray
+    with pytest.raises(AttributeError):
+        jaxtyping.not_an_attribute
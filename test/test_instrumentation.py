@@ -0,0 +1,104 @@
+import pytest
+import jaxtyping
+from jaxtyping import instrumentation
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+
+dim1 = None
+
+
+@pytest.fixture(autouse=True)
+def reset_instrumentation():
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+@typechecked
+def add(x: TensorType["dim1"], y: TensorType["dim1"]) -> TensorType["dim1"]:
+    return x + y
+
+
+def test_instrumentation():
+    x = torch.rand(3)
+    add(x, x)
+    assert instrumentation.snapshot() == {}
+
+    instrumentation.enable()
+    add(x, x)
+    add(x, x)
+    with pytest.raises(TypeError):
+        add(x, torch.rand(4))
+    (name,) = instrumentation.snapshot()
+    assert name.endswith("test_instrumentation.add")
+    stats = instrumentation.snapshot()[name]
+    # Two passing calls check both their arguments and return value.
+    assert stats["checks"] == 5
+    assert stats["failures"] == 1
+    assert 0 < stats["max_time"] <= stats["time"]
+    assert 0 < stats["max_memo_time"] <= stats["memo_time"] <= stats["time"]
+    assert stats["cache_hits"] == stats["cache_misses"] == stats["skipped"] == 0
+
+    instrumentation.disable()
+    add(x, x)
+    assert instrumentation.snapshot()[name]["checks"] == 5
+    instrumentation.reset()
+    assert instrumentation.snapshot() == {}
+
+
+def test_instrumentation_cache_and_sampling():
+    @typechecked
+    @jaxtyping.options(signature_cache_size=4)
+    def cached(x: TensorType["dim1"]):
+        pass
+
+    @typechecked
+    @jaxtyping.options(check_every=2)
+    def sampled(x: TensorType["dim1"]):
+        pass
+
+    instrumentation.enable()
+    for _ in range(4):
+        cached(torch.rand(3))
+        sampled(torch.rand(3))
+    snapshot = instrumentation.snapshot()
+    (cached_stats,) = [v for k, v in snapshot.items() if k.endswith(".cached")]
+    (sampled_stats,) = [v for k, v in snapshot.items() if k.endswith(".sampled")]
+    assert cached_stats["cache_hits"] == 3
+    assert cached_stats["cache_misses"] == 1
+    assert cached_stats["checks"] == 4
+    assert sampled_stats["checks"] == 2
+    assert sampled_stats["skipped"] == 2
+
+
+def test_instrumentation_callback():
+    events = []
+
+    def callback(name, phase, start, duration, failed):
+        events.append((name.rsplit(".", 1)[-1], phase, failed))
+        assert start > 0 and duration >= 0
+
+    instrumentation.add_callback(callback)
+    try:
+        x = torch.rand(3)
+        add(x, x)
+        assert events == []
+        instrumentation.enable()
+        add(x, x)
+        with pytest.raises(TypeError):
+            add(x, torch.rand(2))
+    finally:
+        instrumentation.remove_callback(callback)
+    add(x, x)
+    assert events == [
+        ("add", "arguments", False),
+        ("add", "return", False),
+        ("add", "arguments", True),
+    ]
@@ -0,0 +1,60 @@
+import gc
+import weakref
+from typing import Iterator, List
+
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def _is_alive(ref: weakref.ref) -> bool:
+    gc.collect()
+    return ref() is not None
+
+
+def test_arguments_not_kept_alive():
+    refs = []
+
+    @typechecked
+    def func(xs: List[TensorType["dim1", "dim2"]]) -> TensorType["dim2"]:
+        x = xs.pop()
+        refs.append(weakref.ref(x))
+        del x
+        # The checks of the arguments no longer refer to the array.
+        assert not _is_alive(refs[0])
+        return torch.rand(3)
+
+    func([torch.rand(1000, 3)])
+
+
+def test_return_not_kept_alive():
+    @typechecked
+    def func(x: TensorType["dim1"]) -> TensorType["dim1"]:
+        return torch.rand(*x.shape)
+
+    out = func(torch.rand(1000))
+    ref = weakref.ref(out)
+    del out
+    assert not _is_alive(ref)
+
+
+def test_yielded_items_not_kept_alive():
+    @typechecked
+    def gen(x: TensorType["dim1"]) -> Iterator[TensorType["dim2", "dim1"]]:
+        for _ in range(3):
+            yield torch.rand(1000, x.shape[0])
+
+    items = gen(torch.rand(3))
+    item = next(items)
+    ref = weakref.ref(item)
+    del item
+    # Whilst the generator is still suspended.
+    assert not _is_alive(ref)
+    assert next(items).shape == (1000, 3)
@@ -1,6 +1,6 @@
 import pytest
 from typeguard import typechecked
-from typing import Tuple
+from typing import List, Optional, Tuple
 import jax
 
 from pathlib import Path
@@ -181,3 +181,74 @@ def test_repeat():
         func(torch.rand(4, 3, 5), torch.rand(3, 3))
     with pytest.raises(TypeError):
         func(torch.rand(4, 3, 3), torch.rand(0, 2))
+
+
+def test_compiled_check():
+    annotation = TensorType["dim1":..., "dim2", 3]
+
+    @typechecked
+    def func(x: annotation):
+        pass
+
+    (metadata,) = annotation.__metadata__
+    func(torch.rand(2, 3))
+    check = metadata.compiled_check
+    func(torch.rand(4, 5, 2, 3))
+    assert metadata.compiled_check is check
+    assert check(torch.rand(1, 3))
+    assert not check(torch.rand(3))
+    assert not check(torch.rand(3, 4))
+    with pytest.raises(TypeError):
+        func(torch.rand(2, 4))
+
+
+def test_mixed_annotations():
+    @typechecked
+    def func(
+        n: int,
+        x: TensorType["dim1"],
+        ys: List[TensorType["dim1"]],
+        z: Optional[TensorType["dim1"]] = None,
+    ) -> TensorType["dim1"]:
+        return x
+
+    func(1, torch.rand(3), [torch.rand(3)])
+    func(1, torch.rand(3), [torch.rand(3), torch.rand(3)], z=torch.rand(3))
+    func(n=1, x=torch.rand(2), ys=[])
+    with pytest.raises(TypeError):
+        func("1", torch.rand(3), [torch.rand(3)])
+    with pytest.raises(TypeError):
+        func(1, torch.rand(3), [torch.rand(2)])
+    with pytest.raises(TypeError):
+        func(1, torch.rand(3), [], z=torch.rand(2))
+    with pytest.raises(TypeError):
+        func(1, torch.rand(3, 1), [])
+
+
+def test_interned_annotations():
+    assert TensorType["dim1", 3] is TensorType["dim1", 3]
+    assert TensorType["dim1":..., float] is TensorType["dim1":..., float]
+    assert TensorType["dim1", 3] is not TensorType["dim1", 4]
+    assert TensorType["dim1":3] is not TensorType["dim1", 3]
+    assert TensorType[1] is TensorType[1]
+    with pytest.raises(TypeError):
+        TensorType[True]
+
+
+def test_shape_detail():
+    (metadata,) = TensorType["a", 2, "b":3].__metadata__
+    (detail,) = metadata["details"]
+    other = detail.update()
+    assert other is not detail
+    assert detail == other
+    assert hash(detail) == hash(other)
+    assert detail != detail.update(dims=detail.dims[:2])
+    assert len({detail, other}) == 1
+    with pytest.raises(RuntimeError):
+        detail.dims = ()
+    assert detail.check(torch.rand(5, 2, 3))
+    assert not detail.check(torch.rand(5, 3, 3))
+    assert not detail.check(torch.rand(5, 2, 4))
+    assert not detail.check(torch.rand(2, 3))
+    assert detail.tensor_repr(torch.rand(5, 2, 3)) == "5, 2, 3"
+    assert detail.tensor_repr(torch.rand(5)) == "5"
@@ -0,0 +1,167 @@
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pytest
+import jaxtyping
+from jaxtyping import backends, checked, is_float, JaxArray, NumpyArray
+from typeguard import typechecked
+
+import jax.numpy as jnp
+
+a = batch = None
+
+
+def test_numpy():
+    @typechecked
+    def func(
+        x: NumpyArray["batch", 3, float], y: NumpyArray["batch", int]
+    ) -> NumpyArray["batch"]:
+        return y
+
+    func(np.zeros((2, 3)), np.zeros(2, dtype=int))
+    with pytest.raises(TypeError, match="inconsistent size"):
+        func(np.zeros((2, 3)), np.zeros(3, dtype=int))
+    with pytest.raises(
+        TypeError, match=r"got type NumpyArray\[2, 3, dtype\('float32'\)"
+    ):
+        func(np.zeros((2, 3), dtype=np.float32), np.zeros(2, dtype=int))
+    # JAX arrays aren't NumPy arrays.
+    with pytest.raises(TypeError, match="got type ArrayImpl"):
+        func(jnp.zeros((2, 3)), np.zeros(2, dtype=int))
+
+
+def test_numpy_dtypes():
+    @checked
+    def func(
+        x: NumpyArray[np.float32], y: NumpyArray[bool], z: NumpyArray["a", is_float]
+    ):
+        pass
+
+    func(np.zeros(2, dtype=np.float32), np.zeros(2, dtype=bool), np.zeros(2))
+    with pytest.raises(TypeError):
+        func(np.zeros(2), np.zeros(2, dtype=bool), np.zeros(2))
+    with pytest.raises(TypeError):
+        func(np.zeros(2, dtype=np.float32), np.zeros(2, dtype=bool), np.zeros(2, int))
+    with pytest.raises(TypeError):
+        NumpyArray[str]
+
+
+def test_numpy_and_jax():
+    # Dimension sizes are shared between backends.
+    @checked
+    def func(x: NumpyArray["batch"], y: JaxArray["batch"]):
+        pass
+
+    func(np.zeros(2), jnp.zeros(2))
+    with pytest.raises(TypeError, match="batch"):
+        func(np.zeros(2), jnp.zeros(3))
+    assert isinstance(np.zeros(2), NumpyArray)
+    assert not isinstance(np.zeros(2), JaxArray)
+
+
+def test_numpy_deferred():
+    @typechecked
+    @jaxtyping.options(deferred=True)
+    def func(x: NumpyArray["batch", 3]):
+        pass
+
+    func(np.zeros((2, 3)))
+    jaxtyping.sync_checks()
+    func(np.zeros((2, 4)))
+    with pytest.raises(TypeError, match=r"got type NumpyArray\[2, 4\]"):
+        jaxtyping.sync_checks()
+
+
+def test_numpy_identity_cache():
+    @typechecked
+    @jaxtyping.options(identity_cache=True)
+    def func(x: NumpyArray["batch", 3]):
+        pass
+
+    # NumPy arrays can be reshaped in place, so aren't skipped when seen again.
+    x = np.zeros((2, 3))
+    func(x)
+    x.shape = (3, 2)
+    with pytest.raises(TypeError):
+        func(x)
+
+
+class _Array:
+    def __init__(self, *shape, dtype=np.float32):
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+
+
+class _AbstractArray(_Array):
+    def __init__(self, shape, dtype):
+        super().__init__(*shape, dtype=dtype)
+
+
+def _load_backend():
+    numpy_backend = backends.get_backend("numpy")
+    return backends.Backend(
+        "test",
+        array_type=_Array,
+        abstract_type=_AbstractArray,
+        shaped_array=_AbstractArray,
+        is_dtype=numpy_backend.is_dtype,
+        int_dtype=np.dtype(np.int32),
+        bool_dtype=np.dtype(bool),
+        default_float_dtype=lambda: np.dtype(np.float32),
+        immutable=False,
+    )
+
+
+def test_register_backend():
+    backends.register_backend("test", _load_backend, class_name="TestArray")
+    with pytest.raises(ValueError):
+        backends.register_backend("test", _load_backend)
+    with pytest.raises(ValueError):
+        backends.register_backend("test2", _load_backend, class_name="JaxArray")
+    assert "test" not in backends._backends
+    TestArray = jaxtyping.TestArray
+    assert TestArray is jaxtyping.tensor_type.TestArray
+    assert "TestArray" in dir(jaxtyping)
+
+    @checked
+    def func(x: TestArray["batch", float], y: NumpyArray["batch"]):
+        pass
+
+    func(_Array(2), np.zeros(2))
+    with pytest.raises(TypeError, match="batch"):
+        func(_Array(2), np.zeros(3))
+    with pytest.raises(TypeError, match=r"got type TestArray\[2, dtype\('int32'\)\]"):
+        func(_Array(2, dtype=np.int32), np.zeros(2))
+
+
+# Run in a subprocess, as what's been imported depends on everything else that the
+# process has done.
+_script = textwrap.dedent("""
+    import sys
+
+    import numpy as np
+    import jaxtyping
+    from jaxtyping import NumpyArray, checked
+
+    @checked
+    def func(x: NumpyArray["batch", float]) -> NumpyArray["batch"]:
+        return x
+
+    func(np.zeros(2))
+    try:
+        func(np.zeros((2, 3)))
+    except TypeError:
+        pass
+    else:
+        raise AssertionError
+    assert "jax" not in sys.modules
+    """)
+
+
+def test_numpy_without_jax():
+    result = subprocess.run(
+        [sys.executable, "-c", _script], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
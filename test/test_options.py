@@ -0,0 +1,247 @@
+import gc
+
+import pytest
+import jaxtyping
+from jaxtyping import is_float, PyTree, TensorDetail
+from jaxtyping.typechecker import _plans
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+
+dim1 = dim2 = batch = None
+
+
+def test_signature_cache():
+    @typechecked
+    @jaxtyping.options(signature_cache_size=2)
+    def func(x: TensorType["dim1", 3], n: int) -> TensorType["dim1"]:
+        return x[:, n] if n >= 0 else x
+
+    for _ in range(3):
+        func(torch.rand(2, 3), 0)
+        func(torch.rand(4, 3), 1)
+    cache = _plans[func.__wrapped__].signature_cache
+    assert len(cache) == 2
+
+    func(torch.rand(5, 3), 2)
+    assert len(cache) == 2
+    assert list(cache.values())[-1] == ({"dim1": 5}, {})
+
+    # Still checked on a cache hit.
+    with pytest.raises(TypeError):
+        func(torch.rand(5, 3), "2")
+    with pytest.raises(TypeError):
+        func(torch.rand(5, 3), -1)
+    with pytest.raises(TypeError):
+        func(torch.rand(5, 4), 0)
+    with pytest.raises(TypeError):
+        func([[1, 2, 3]], 0)
+
+
+def test_signature_cache_eviction():
+    @typechecked
+    @jaxtyping.options(signature_cache_size=2)
+    def func(x: TensorType["dim1"]):
+        pass
+
+    func(torch.rand(1))
+    func(torch.rand(2))
+    # Used since it was stored, so it isn't evicted despite being the oldest.
+    func(torch.rand(1))
+    func(torch.rand(3))
+    cache = _plans[func.__wrapped__].signature_cache
+    assert list(cache.values()) == [({"dim1": 1}, {}), ({"dim1": 3}, {})]
+    # Now only 3 has been used since 1 was given a second chance.
+    func(torch.rand(3))
+    func(torch.rand(4))
+    assert list(cache.values()) == [({"dim1": 3}, {}), ({"dim1": 4}, {})]
+
+
+def test_signature_cache_options():
+    @typechecked
+    def func(x: TensorType["dim1"], y: TensorType["dim1"]):
+        pass
+
+    func(torch.rand(2), torch.rand(2))
+    assert _plans[func.__wrapped__].signature_cache is None
+
+    jaxtyping.set_options(__name__, signature_cache_size=4)
+    func(torch.rand(2), torch.rand(2))
+    assert len(_plans[func.__wrapped__].signature_cache) == 1
+    with pytest.raises(TypeError):
+        func(torch.rand(2), torch.rand(3))
+
+    jaxtyping.set_options("other_module", signature_cache_size=0)
+    func(torch.rand(2), torch.rand(2))
+    assert _plans[func.__wrapped__].signature_cache is not None
+
+    with pytest.raises(TypeError):
+        jaxtyping.set_options(not_an_option=1)
+    with pytest.raises(ValueError):
+        jaxtyping.set_options(signature_cache_size=-1)
+
+
+class CountingDetail(TensorDetail):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def check(self, array) -> bool:
+        self.count += 1
+        return True
+
+    def __repr__(self) -> str:
+        return "CountingDetail"
+
+    @classmethod
+    def tensor_repr(cls, array) -> str:
+        return ""
+
+
+def test_signature_cache_custom_detail():
+    detail = CountingDetail()
+
+    @typechecked
+    @jaxtyping.options(signature_cache_size=4)
+    def func(x: TensorType["dim1", detail], y: TensorType["dim1", is_float]):
+        pass
+
+    count = detail.count
+    for _ in range(3):
+        func(torch.rand(2), torch.rand(2))
+    assert detail.count > count
+    count = detail.count
+    func(torch.rand(2), torch.rand(2))
+    assert detail.count > count
+    assert _plans[func.__wrapped__].signature_cache is None
+
+
+def test_check_every():
+    @typechecked
+    @jaxtyping.options(check_every=3)
+    def func(x: TensorType["dim1"], n: int):
+        pass
+
+    func(torch.rand(2), 0)
+    func(torch.rand(2), "skipped")
+    func(torch.rand(2), "skipped")
+    with pytest.raises(TypeError):
+        func(torch.rand(2), "checked")
+    # A new signature is always checked.
+    with pytest.raises(TypeError):
+        func(torch.rand(3), "checked")
+    func(torch.rand(3), 0)
+    func(torch.rand(3), "skipped")
+    assert jaxtyping.check_counts(func) == {"checked": 4, "skipped": 3}
+
+
+def test_backoff():
+    jaxtyping.set_options(__name__, backoff_after=2, backoff_max_interval=4)
+
+    @typechecked
+    def func(x: TensorType["dim1"]):
+        pass
+
+    for _ in range(12):
+        func(torch.rand(2))
+    # Checked calls 0, 1, 3, 7, 11.
+    assert jaxtyping.check_counts(func) == {"checked": 5, "skipped": 7}
+
+
+def test_check_counts_not_sampling():
+    @typechecked
+    def func(x: TensorType["dim1"]):
+        pass
+
+    func(torch.rand(2))
+    with pytest.raises(ValueError):
+        jaxtyping.check_counts(func)
+
+
+def test_identity_cache():
+    detail = CountingDetail()
+    annotation = TensorType["dim1", detail]
+
+    @typechecked
+    @jaxtyping.options(identity_cache=True)
+    def func(x: annotation, y: TensorType["dim1"]):
+        pass
+
+    x = torch.rand(2)
+    func(x, torch.rand(2))
+    count = detail.count
+    func(x, torch.rand(2))
+    assert detail.count == count
+    # Dimension sizes are still bound by cached arrays.
+    with pytest.raises(TypeError, match="dim1"):
+        func(x, torch.rand(3))
+    func(torch.rand(2), torch.rand(2))
+    assert detail.count > count
+
+    cache = annotation.__metadata__[0].identity_cache
+    size = len(cache.refs)
+    del x
+    gc.collect()
+    assert len(cache.refs) < size
+
+
+def test_identity_cache_pytree():
+    detail = CountingDetail()
+    spec = {"w": TensorType["dim1", detail]}
+
+    @typechecked
+    @jaxtyping.options(identity_cache=True)
+    def func(params: PyTree[spec]):
+        pass
+
+    params = {"w": torch.rand(3)}
+    func(params)
+    count = detail.count
+    func(params)
+    assert detail.count == count
+    with pytest.raises(TypeError):
+        func({"w": torch.rand(3, 3)})
+
+
+def test_identity_cache_binds_directly(monkeypatch):
+    from jaxtyping import typechecker
+
+    check_memo = typechecker._check_memo
+    pending = []
+
+    def _check_memo(memo):
+        pending.append([info[0] for info in memo.value_info])
+        check_memo(memo)
+
+    monkeypatch.setattr(typechecker, "_check_memo", _check_memo)
+
+    @typechecked
+    @jaxtyping.options(identity_cache=True)
+    def func(
+        x: TensorType["dim1", "dim2"],
+        y: TensorType["dim2"],
+        z: TensorType["batch":..., "dim2"],
+    ):
+        pass
+
+    x = torch.rand(2, 3)
+    y = torch.rand(3)
+    z = torch.rand(4, 3)
+    func(x, y, z)
+    func(x, y, z)
+    # Once cached, only arrays with a `...` are left for _check_memo.
+    assert pending == [
+        ['argument "x"', 'argument "y"', 'argument "z"'],
+        ['argument "z"'],
+    ]
+    with pytest.raises(TypeError, match="dim2"):
+        func(x, torch.rand(4), z)
+    with pytest.raises(TypeError, match="dim2"):
+        func(x, y, torch.rand(4, 4))
+    with pytest.raises(TypeError, match="dim2"):
+        func(torch.rand(2, 4), y, z)
@@ -0,0 +1,80 @@
+import time
+from typing import Any
+
+import pytest
+from jaxtyping import checked_prefetch
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+
+def test_prefetch_single():
+    batches = [torch.rand(2, 3), torch.rand(4, 3)]
+    out = list(checked_prefetch(batches, TensorType["batch", 3]))
+    assert out == batches
+
+
+def test_prefetch_pytree():
+    spec = {"x": TensorType["batch", "dim"], "y": (TensorType["batch"], Any)}
+    good = {"x": torch.rand(2, 3), "y": (torch.rand(2), "metadata")}
+    bad = {"x": torch.rand(2, 3), "y": (torch.rand(5), "metadata")}
+    wrong_structure = {"x": torch.rand(2, 3)}
+
+    it = checked_prefetch([good, good, bad, good], spec, workers=3)
+    assert next(it) is good
+    assert next(it) is good
+    with pytest.raises(TypeError, match="batch"):
+        next(it)
+
+    with pytest.raises(TypeError, match="structure"):
+        list(checked_prefetch([wrong_structure], spec))
+
+    with pytest.raises(TypeError):
+        checked_prefetch([], {"x": int})
+
+
+def test_prefetch_in_order():
+    source = (torch.rand(i + 1) for i in range(32))
+    out = list(checked_prefetch(source, TensorType["n"], buffer_size=4, workers=4))
+    assert [x.shape for x in out] == [(i + 1,) for i in range(32)]
+
+
+def test_prefetch_source_error():
+    def source():
+        yield torch.rand(2)
+        raise ValueError("source failed")
+
+    it = checked_prefetch(source(), TensorType["n"])
+    next(it)
+    with pytest.raises(ValueError, match="source failed"):
+        next(it)
+
+
+def test_prefetch_ahead():
+    pulled = []
+
+    def source():
+        for i in range(10):
+            pulled.append(i)
+            yield torch.rand(2)
+
+    it = checked_prefetch(source(), TensorType["n"], buffer_size=3)
+    next(it)
+    # Fills the buffer without waiting for the consumer, but doesn't go further.
+    deadline = time.time() + 5
+    while len(pulled) < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    assert 4 <= len(pulled) <= 5
+    it.close()
+
+
+def test_prefetch_invalid():
+    with pytest.raises(ValueError):
+        checked_prefetch([], TensorType["n"], buffer_size=0)
+    with pytest.raises(ValueError):
+        checked_prefetch([], TensorType["n"], workers=0)
@@ -0,0 +1,82 @@
+import textwrap
+from types import SimpleNamespace
+
+from jaxtyping import instrumentation, pytest_plugin
+
+pytest_plugins = "pytester"
+
+
+_test_file = textwrap.dedent("""
+    import jax.numpy as jnp
+    from jaxtyping import JaxArray
+    from typeguard import typechecked
+
+
+    @typechecked
+    def often(x: JaxArray["a"]) -> JaxArray["a"]:
+        return x
+
+
+    @typechecked
+    def rarely(x: JaxArray["a"], y: JaxArray["a"]):
+        pass
+
+
+    def test_functions():
+        x = jnp.zeros(3)
+        for _ in range(10):
+            often(x)
+        rarely(x, x)
+    """)
+
+
+def _run(pytester, *args):
+    pytester.makepyfile(test_file=_test_file)
+    # Loaded explicitly, in case jaxtyping isn't installed.
+    return pytester.runpytest_inprocess(
+        "-p",
+        "no:jaxtyping",
+        "-p",
+        "jaxtyping.pytest_plugin",
+        "--jaxtyping-patch-typeguard",
+        *args
+    )
+
+
+def test_durations(pytester):
+    result = _run(pytester, "--jaxtyping-durations=1")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*jaxtyping: 1 functions with the most checking time*",
+            "*total*max*checks*failures*skipped*function*",
+            "*jaxtyping: 1 functions with the most checks*",
+            "*total*max*checks*failures*skipped*function*",
+            "* 20 * 0 * 0  test_file.often",
+        ]
+    )
+    assert "test_file.rarely" not in result.stdout.str()
+    assert not instrumentation.is_enabled()
+
+    result = _run(pytester, "--jaxtyping-durations=0")
+    result.stdout.fnmatch_lines(["*test_file.rarely", "*test_file.rarely"])
+
+
+def test_no_durations(pytester):
+    result = _run(pytester)
+    result.assert_outcomes(passed=1)
+    assert "jaxtyping" not in result.stdout.str()
+
+
+def test_xdist_merge():
+    # The controller merges the statistics sent back by each worker.
+    stats = {"checks": 2, "time": 0.5, "max_time": 0.3, "failures": 0}
+    pytest_plugin._worker_snapshots.clear()
+    for _ in range(2):
+        node = SimpleNamespace(workeroutput={"jaxtyping_durations": {"f": stats}})
+        pytest_plugin.pytest_testnodedown(node, None)
+    merged = {}
+    for snapshot in pytest_plugin._worker_snapshots:
+        instrumentation._merge(merged, snapshot)
+    pytest_plugin._worker_snapshots.clear()
+    assert merged == {"f": {"checks": 4, "time": 1.0, "max_time": 0.3, "failures": 0}}
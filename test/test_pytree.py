@@ -0,0 +1,69 @@
+from typing import Any, Optional
+
+import pytest
+import jaxtyping
+from jaxtyping import PyTree
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def test_pytree_structure():
+    spec = {"w": TensorType["dim1", "dim2"], "b": TensorType["dim2"], "step": Any}
+
+    @typechecked
+    def func(params: PyTree[spec], x: TensorType["dim1"]) -> TensorType["dim2"]:
+        return params["b"]
+
+    params = {"w": torch.rand(2, 3), "b": torch.rand(3), "step": 0}
+    func(params, torch.rand(2))
+    # Dimension sizes are shared across the tree, and with the other arguments.
+    with pytest.raises(TypeError, match="dim1"):
+        func(params, torch.rand(3))
+    with pytest.raises(TypeError, match="dim2"):
+        func({"w": torch.rand(2, 3), "b": torch.rand(4), "step": 0}, torch.rand(2))
+    with pytest.raises(TypeError, match=r"argument \"params\"\['w'\]"):
+        func({"w": torch.rand(2), "b": torch.rand(3), "step": 0}, torch.rand(2))
+    with pytest.raises(TypeError, match="tree structure"):
+        func({"w": torch.rand(2, 3), "b": torch.rand(3)}, torch.rand(2))
+
+
+def test_pytree_uniform():
+    @typechecked
+    def func(xs: PyTree[TensorType["dim1", 3]]):
+        pass
+
+    func([torch.rand(2, 3), {"a": torch.rand(2, 3), "b": (torch.rand(2, 3),)}])
+    func(torch.rand(4, 3))
+    func([])
+    with pytest.raises(TypeError, match="leaf 1"):
+        func([torch.rand(2, 3), torch.rand(2, 4)])
+    with pytest.raises(TypeError, match="inconsistent size"):
+        func([torch.rand(2, 3), torch.rand(4, 3)])
+    with pytest.raises(TypeError):
+        func([torch.rand(2, 3), 1.0])
+
+
+def test_pytree_nested():
+    @typechecked
+    def func(xs: Optional[PyTree[(TensorType["dim1"], TensorType["dim1"])]]):
+        pass
+
+    func(None)
+    func((torch.rand(2), torch.rand(2)))
+    with pytest.raises(TypeError):
+        func((torch.rand(2), torch.rand(3)))
+
+
+def test_pytree_bad_spec():
+    with pytest.raises(TypeError, match="leaves of a spec"):
+        PyTree[{"a": int}]
+    with pytest.raises(RuntimeError):
+        jaxtyping.PyTree()
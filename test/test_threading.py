@@ -0,0 +1,132 @@
+import concurrent.futures
+import inspect
+import threading
+import time
+import weakref
+
+import pytest
+import typeguard
+import jaxtyping
+from jaxtyping import instrumentation, patch_typeguard
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = dim2 = None
+
+
+def _run_in_threads(work, num_threads=8):
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+        return list(executor.map(work, range(num_threads)))
+
+
+def test_concurrent_checks():
+    @typechecked
+    @jaxtyping.options(signature_cache_size=2)
+    def func(
+        x: TensorType["dim1", "dim2"], y: TensorType["dim2"]
+    ) -> TensorType["dim1"]:
+        return x[:, 0]
+
+    def work(index):
+        size = index % 3 + 1
+        failures = 0
+        for i in range(200):
+            x = torch.rand(size, 4)
+            y = torch.rand(4 if i % 2 else 5)
+            try:
+                assert func(x, y).shape == (size,)
+            except TypeError:
+                failures += 1
+        return failures
+
+    assert _run_in_threads(work) == [100] * 8
+
+
+def test_concurrent_annotations():
+    def work(index):
+        return [TensorType["dim2":..., "dim1", 3] for _ in range(100)]
+
+    annotations = {id(a) for result in _run_in_threads(work) for a in result}
+    assert len(annotations) == 1
+
+
+def test_concurrent_patch():
+    _run_in_threads(lambda _: patch_typeguard())
+
+
+def test_concurrent_instrumentation():
+    @typechecked
+    def func(x: TensorType["dim1"]):
+        pass
+
+    instrumentation.enable()
+    try:
+        _run_in_threads(lambda _: [func(torch.rand(3)) for _ in range(100)])
+    finally:
+        instrumentation.disable()
+    (stats,) = [v for k, v in instrumentation.snapshot().items() if k.endswith(".func")]
+    instrumentation.reset()
+    assert stats["checks"] == 800
+
+
+def test_concurrent_patch_while_checking(monkeypatch):
+    # A function checked while another thread is still patching typeguard has to wait
+    # for patching to finish, rather than using a half-finished patch.
+    from jaxtyping import checked, typechecker
+
+    @checked
+    def func(x: TensorType["dim1"], y: int) -> TensorType["dim1"]:
+        return x
+
+    # Patch again, on top of the existing patch, and undo it all afterwards.
+    for name in (
+        "_CallMemo",
+        "TypeCheckedGenerator",
+        "TypeCheckedAsyncGenerator",
+        "check_type",
+        "check_argument_types",
+        "check_return_type",
+        "get_type_hints",
+    ):
+        monkeypatch.setattr(typeguard, name, getattr(typeguard, name))
+    for name in (
+        "_typeguard_check_type",
+        "_typeguard_check_return_type",
+        "_patched_check_type",
+    ):
+        monkeypatch.setattr(typechecker, name, None)
+    monkeypatch.setattr(typechecker, "_plans", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(typechecker, "unpatched_typeguard", True)
+
+    patcher = None
+    started = threading.Event()
+    signature = inspect.signature
+
+    def slow_signature(*args, **kwargs):
+        if threading.current_thread() is patcher:
+            started.set()
+            time.sleep(0.2)
+        return signature(*args, **kwargs)
+
+    def patch():
+        nonlocal patcher
+        patcher = threading.current_thread()
+        patch_typeguard()
+
+    monkeypatch.setattr(inspect, "signature", slow_signature)
+    with concurrent.futures.ThreadPoolExecutor(1) as executor:
+        patching = executor.submit(patch)
+        assert started.wait(5)
+        func(torch.rand(3), 1)
+        patching.result()
+    func(torch.rand(3), 1)
+    with pytest.raises(TypeError):
+        func(torch.rand(3, 4), 1)
+    with pytest.raises(TypeError):
+        func(torch.rand(3), "1")
@@ -0,0 +1,97 @@
+import contextlib
+import json
+
+import pytest
+from jaxtyping import instrumentation, tracing
+from typeguard import typechecked
+
+from pathlib import Path
+import sys
+
+sys.path.append(Path(__file__).parent.resolve())
+from torch_surrogate import TensorType
+import torch_surrogate as torch
+
+dim1 = None
+
+
+@pytest.fixture(autouse=True)
+def reset_instrumentation():
+    yield
+    instrumentation.reset()
+
+
+@typechecked
+def add(x: TensorType["dim1"], y: TensorType["dim1"]) -> TensorType["dim1"]:
+    return x + y
+
+
+def test_chrome_trace(tmp_path):
+    x = torch.rand(3)
+    with tracing.ChromeTrace() as trace:
+        add(x, x)
+        with pytest.raises(TypeError):
+            add(x, torch.rand(4))
+    add(x, x)
+    assert not instrumentation.is_enabled()
+
+    assert [event["args"] for event in trace.events] == [
+        {"phase": "arguments", "failed": False},
+        {"phase": "return", "failed": False},
+        {"phase": "arguments", "failed": True},
+    ]
+    for event in trace.events:
+        assert event["name"].endswith("test_tracing.add")
+        assert event["ph"] == "X"
+        assert event["dur"] >= 0
+    # Spans don't overlap.
+    first, second, third = trace.events
+    assert first["ts"] + first["dur"] <= second["ts"]
+    assert second["ts"] + second["dur"] <= third["ts"]
+
+    path = tmp_path / "trace.json"
+    trace.save(str(path))
+    assert json.loads(path.read_text())["traceEvents"] == trace.events
+
+    with pytest.raises(RuntimeError):
+        trace.stop()
+
+
+def test_span_hooks():
+    spans = []
+
+    @contextlib.contextmanager
+    def hook(name, phase):
+        spans.append(("enter", name.rsplit(".", 1)[-1], phase))
+        yield
+        spans.append(("exit", name.rsplit(".", 1)[-1], phase))
+
+    x = torch.rand(3)
+    instrumentation.add_span_hook(hook)
+    try:
+        add(x, x)
+        assert spans == []
+        instrumentation.enable()
+        add(x, x)
+        with pytest.raises(TypeError):
+            add(x, torch.rand(4))
+    finally:
+        instrumentation.disable()
+        instrumentation.remove_span_hook(hook)
+    assert spans == [
+        ("enter", "add", "arguments"),
+        ("exit", "add", "arguments"),
+        ("enter", "add", "return"),
+        ("exit", "add", "return"),
+        ("enter", "add", "arguments"),
+        ("exit", "add", "arguments"),
+    ]
+
+
+def test_jax_annotations():
+    x = torch.rand(3)
+    with tracing.jax_annotations():
+        assert tracing._trace_annotation in instrumentation._span_hooks
+        add(x, x)
+    assert tracing._trace_annotation not in instrumentation._span_hooks
+    assert not instrumentation.is_enabled()
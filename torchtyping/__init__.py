@@ -1,3 +1,7 @@
+import importlib
+
+from . import backends, instrumentation
+from .config import options, reset_options, set_options
 from .tensor_details import (
     DtypeDetail,
     is_float,
@@ -6,7 +10,45 @@ from .tensor_details import (
     TensorDetail,
 )
 
-from .tensor_type import JaxArray
-from .typechecker import patch_typeguard, jit, typed_jit
+from typing import Any, List
 
 __version__ = "0.1.4"
+
+# Everything that needs JAX is only imported once it's first used, so that importing
+# jaxtyping (for example just to read annotations) doesn't also import JAX. (PEP 562.)
+_lazy_attributes = {
+    "checked_prefetch": "prefetch",
+    "PyTree": "pytree",
+    "check_counts": "typechecker",
+    "checked": "typechecker",
+    "patch_typeguard": "typechecker",
+    "jit": "typechecker",
+    "sync_checks": "typechecker",
+    "typed_jit": "typechecker",
+}
+_lazy_submodules = ("tracing",)
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_attributes:
+        module = importlib.import_module(f".{_lazy_attributes[name]}", __name__)
+        value = getattr(module, name)
+    elif name in backends._array_classes:
+        # JaxArray, NumpyArray, and the classes of any other registered backends.
+        module = importlib.import_module(".tensor_type", __name__)
+        value = getattr(module, name)
+    elif name in _lazy_submodules:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(
+        set(globals())
+        | set(_lazy_attributes)
+        | set(_lazy_submodules)
+        | set(backends._array_classes)
+    )
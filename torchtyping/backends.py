@@ -0,0 +1,170 @@
+"""The array libraries that annotations can be written for.
+
+A backend describes one array library: the class of its arrays, which of its objects
+are dtypes, what `int`, `bool` and `float` mean as dtypes, and its "abstract" arrays,
+which have a shape and dtype but no data (such as the values JAX traces with). Every
+backend shares the same checking machinery.
+
+Backends are only loaded -- importing their library -- once an annotation needs them,
+so that for example a process only using `NumpyArray` never imports JAX.
+"""
+
+import threading
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class Backend:
+    # `shaped_array(shape, dtype)` makes an instance of `abstract_type`, to stand in
+    # for an array of that shape and dtype. `default_float_dtype()` is the dtype of
+    # `float` in an annotation; it's looked up each time it's needed, as it may depend
+    # on configuration. `immutable` is whether an array that has passed a check will
+    # always pass it. (See the `identity_cache` option.)
+    __slots__ = (
+        "name",
+        "array_type",
+        "abstract_type",
+        "shaped_array",
+        "is_dtype",
+        "int_dtype",
+        "bool_dtype",
+        "default_float_dtype",
+        "immutable",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        array_type: type,
+        abstract_type: type,
+        shaped_array: Callable[[Tuple[int, ...], Any], Any],
+        is_dtype: Callable[[Any], bool],
+        int_dtype: Any,
+        bool_dtype: Any,
+        default_float_dtype: Callable[[], Any],
+        immutable: bool,
+    ):
+        self.name = name
+        self.array_type = array_type
+        self.abstract_type = abstract_type
+        self.shaped_array = shaped_array
+        self.is_dtype = is_dtype
+        self.int_dtype = int_dtype
+        self.bool_dtype = bool_dtype
+        self.default_float_dtype = default_float_dtype
+        self.immutable = immutable
+
+    def __repr__(self) -> str:
+        return f"Backend({self.name!r})"
+
+
+def _load_jax() -> Backend:
+    import jax
+    import jax.numpy as jnp
+
+    return Backend(
+        "jax",
+        array_type=jnp.ndarray,
+        abstract_type=jax.core.UnshapedArray,
+        shaped_array=jax.core.ShapedArray,
+        is_dtype=lambda item: isinstance(item, (jnp.dtype, type(jnp.int32))),
+        int_dtype=jnp.dtype("int64"),
+        bool_dtype=jnp.dtype("bool"),
+        # As `jnp.ones(()).dtype`, but without creating an array, which would
+        # initialise a JAX backend.
+        default_float_dtype=lambda: jax.dtypes.canonicalize_dtype(float),
+        immutable=True,
+    )
+
+
+class _ShapedArray:
+    # The abstract arrays of the NumPy backend.
+    __slots__ = ("shape", "dtype")
+
+    def __init__(self, shape: Tuple[int, ...], dtype: Any):
+        self.shape = shape
+        self.dtype = dtype
+
+
+def _load_numpy() -> Backend:
+    import numpy as np
+
+    float_dtype = np.dtype(float)
+    return Backend(
+        "numpy",
+        array_type=np.ndarray,
+        abstract_type=_ShapedArray,
+        shaped_array=_ShapedArray,
+        is_dtype=lambda item: isinstance(item, np.dtype)
+        or (isinstance(item, type) and issubclass(item, np.generic)),
+        int_dtype=np.dtype(int),
+        bool_dtype=np.dtype(bool),
+        default_float_dtype=lambda: float_dtype,
+        # The shape and dtype of a NumPy array can be changed in place.
+        immutable=False,
+    )
+
+
+# Each backend's loader, and the backends loaded so far. Written with `_lock`.
+_loaders: Dict[str, Callable[[], Backend]] = {"jax": _load_jax, "numpy": _load_numpy}
+# The name of each backend's annotation class, and the backend that it's for. The
+# classes themselves are created by `jaxtyping.tensor_type` when first used. Written
+# with `_lock`.
+_array_classes: Dict[str, str] = {"JaxArray": "jax", "NumpyArray": "numpy"}
+_backends: Dict[str, Backend] = {}
+_lock = threading.Lock()
+# The array classes, and the abstract array classes, of every loaded backend. Replaced
+# rather than mutated, so that they can be read without locking.
+_array_types: Tuple[type, ...] = ()
+_abstract_types: Tuple[type, ...] = ()
+
+
+def register_backend(
+    name: str, loader: Callable[[], Backend], class_name: Optional[str] = None
+) -> None:
+    """Registers a backend, which is loaded by calling `loader()` the first time it's
+    needed.
+
+    If `class_name` is passed, then annotations for the backend's arrays are written as
+    `jaxtyping.<class_name>[...]`, just like `JaxArray[...]`. (The class is created, and
+    the backend loaded, when it's first used.)
+    """
+    with _lock:
+        if name in _loaders:
+            raise ValueError(f"There is already a backend called {name!r}.")
+        if class_name is not None:
+            if not class_name.isidentifier():
+                raise ValueError(f"{class_name!r} is not a valid class name.")
+            if class_name in _array_classes:
+                raise ValueError(f"There is already a class called {class_name!r}.")
+            _array_classes[class_name] = name
+        _loaders[name] = loader
+
+
+def get_backend(name: str) -> Backend:
+    """Returns the backend called `name`, loading it if need be."""
+    global _array_types, _abstract_types
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _backends:
+            try:
+                loader = _loaders[name]
+            except KeyError:
+                raise ValueError(f"There is no backend called {name!r}.") from None
+            backend = loader()
+            _backends[name] = backend
+            _array_types += (backend.array_type,)
+            _abstract_types += (backend.abstract_type,)
+        return _backends[name]
+
+
+def _backend_of(array_type: type) -> Backend:
+    # The loaded backend whose arrays are of type `array_type`.
+    for backend in list(_backends.values()):
+        if issubclass(array_type, backend.array_type):
+            return backend
+    raise ValueError(f"There is no backend for {array_type!r}.")
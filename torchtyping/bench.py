@@ -0,0 +1,444 @@
+"""Benchmarks for the per-call overhead of jaxtyping's runtime checking.
+
+Run with `python -m jaxtyping.bench`. See `python -m jaxtyping.bench --help` for
+options, including how to save results as JSON and compare them against a stored
+baseline.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+import timeit
+
+import jax
+import jax.numpy as jnp
+import typeguard
+
+from . import __version__, config, tensor_type
+from .pytree import PyTree
+from .tensor_details import is_float
+from .tensor_type import JaxArray
+from .typechecker import checked, patch_typeguard
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _make_function(
+    num_args: int, annotation: Any, return_annotation: Any = None
+) -> Callable:
+    # Builds `def f(x0: annotation, ..., xN: annotation) -> return_annotation`, which
+    # returns its first argument. A real signature is needed as typeguard inspects it.
+    params = ", ".join(f"x{i}: annotation" for i in range(num_args))
+    ret = "" if return_annotation is None else " -> return_annotation"
+    namespace = {"annotation": annotation, "return_annotation": return_annotation}
+    exec(f"def f({params}){ret}:\n    return x0\n", namespace)
+    return namespace["f"]
+
+
+def _call_case(
+    num_args: int,
+    annotation: Any,
+    shapes: List[Tuple[int, ...]],
+    return_annotation: Any = None,
+    dtype: Any = None,
+    options: Optional[Dict[str, Any]] = None,
+    decorator: Callable[[Callable], Callable] = typeguard.typechecked,
+) -> Tuple[Callable, Callable]:
+    func = _make_function(num_args, annotation, return_annotation)
+    if options is None:
+        checked_func = decorator(func)
+    else:
+        checked_func = decorator(config.options(**options)(func))
+    args = [jnp.zeros(shape, dtype=dtype) for shape in shapes]
+    return lambda: checked_func(*args), lambda: func(*args)
+
+
+def _container_case(annotation: Any, value: Any) -> Tuple[Callable, Callable]:
+    # A single argument, such as a container of arrays.
+    func = _make_function(1, annotation)
+    checked = typeguard.typechecked(func)
+    return lambda: checked(value), lambda: func(value)
+
+
+def _tree(num_leaves: int) -> Dict[str, jnp.ndarray]:
+    return {f"leaf{i}": jnp.zeros((2, 3)) for i in range(num_leaves)}
+
+
+def _trace_case(num_args: int, annotation: Any, shape: Tuple[int, ...]):
+    # typed_jit only checks when JAX traces the function, so it's tracing that we
+    # time. (make_jaxpr traces afresh on every call.)
+    func = _make_function(num_args, annotation, annotation)
+    checked = jax.make_jaxpr(typeguard.typechecked(func))
+    unchecked = jax.make_jaxpr(func)
+    args = [jnp.zeros(shape) for _ in range(num_args)]
+    return lambda: checked(*args), lambda: unchecked(*args)
+
+
+def _cases() -> Dict[str, Callable[[], Tuple[Callable, Callable]]]:
+    # Each case is a zero-argument function returning a (checked, baseline) pair of
+    # zero-argument callables. They're built lazily so that only the selected cases
+    # pay their setup cost.
+    cases = {}
+    # No JaxArray annotations at all: just typeguard's own overhead.
+    cases["no_jaxarray"] = lambda: _call_case(1, jnp.ndarray, [()])
+    for num_args in (1, 4, 16):
+        cases[f"args={num_args}"] = lambda n=num_args: _call_case(
+            n, JaxArray["a", "b"], [(2, 3)] * n
+        )
+    for num_dims in (1, 4, 8):
+        names = tuple(f"d{i}" for i in range(num_dims))
+        cases[f"named_dims={num_dims}"] = lambda names=names: _call_case(
+            2, JaxArray[names], [(2,) * len(names)] * 2
+        )
+    cases["fixed_dims"] = lambda: _call_case(2, JaxArray[2, 3], [(2, 3)] * 2)
+    cases["ellipsis"] = lambda: _call_case(2, JaxArray[..., "a"], [(4, 5, 3), (2, 3)])
+    cases["named_ellipsis"] = lambda: _call_case(
+        2, JaxArray["batch":..., "a"], [(4, 5, 3)] * 2
+    )
+    cases["dtype"] = lambda: _call_case(
+        2, JaxArray["a", jnp.float32], [(3,)] * 2, dtype=jnp.float32
+    )
+    cases["is_float"] = lambda: _call_case(2, JaxArray["a", is_float], [(3,)] * 2)
+    cases["return"] = lambda: _call_case(
+        2, JaxArray["a", "b"], [(2, 3)] * 2, return_annotation=JaxArray["a", "b"]
+    )
+    # jaxtyping.checked rather than typeguard.typechecked.
+    for num_args in (1, 4, 16):
+        cases[f"checked,args={num_args}"] = lambda n=num_args: _call_case(
+            n, JaxArray["a", "b"], [(2, 3)] * n, decorator=checked
+        )
+    cases["checked,return"] = lambda: _call_case(
+        2,
+        JaxArray["a", "b"],
+        [(2, 3)] * 2,
+        return_annotation=JaxArray["a", "b"],
+        decorator=checked,
+    )
+    cases["checked,no_jaxarray"] = lambda: _call_case(
+        1, jnp.ndarray, [()], decorator=checked
+    )
+    # The same arrays every call, as for model parameters.
+    cases["identity_cache"] = lambda: _call_case(
+        4, JaxArray["a", "b"], [(2, 3)] * 4, options={"identity_cache": True}
+    )
+    cases["checked,identity_cache"] = lambda: _call_case(
+        16,
+        JaxArray["a", "b"],
+        [(2, 3)] * 16,
+        options={"identity_cache": True},
+        decorator=checked,
+    )
+    # Annotations are built outside of Dict[...] etc., as otherwise flake8 reads their
+    # dimension names as forward references.
+    leaf = JaxArray["a", "b"]
+    for num_leaves in (16, 256):
+        # Typeguard walking the dictionary, versus a single pass over its leaves.
+        cases[f"dict,leaves={num_leaves}"] = lambda n=num_leaves: _container_case(
+            Dict[str, leaf], _tree(n)
+        )
+        cases[f"pytree,leaves={num_leaves}"] = lambda n=num_leaves: _container_case(
+            PyTree[leaf], _tree(n)
+        )
+    element = JaxArray["a", 3]
+    for num_elements in (16, 1024):
+        cases[f"list,elements={num_elements}"] = lambda n=num_elements: (
+            _container_case(List[element], [jnp.zeros((2, 3))] * n)
+        )
+    for num_args in (1, 4):
+        cases[f"typed_jit_trace,args={num_args}"] = lambda n=num_args: _trace_case(
+            n, JaxArray["a", "b"], (2, 3)
+        )
+    return cases
+
+
+def _time(func: Callable[[], Any], number: int, repeat: int) -> float:
+    # Nanoseconds per call. The minimum over repeats is the least noisy estimate.
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e9
+
+
+def run(
+    *, quick: bool = False, select: Optional[str] = None, repeat: int = 5
+) -> Dict[str, Any]:
+    """Runs the benchmarks, returning the results as a JSON-serialisable dictionary.
+
+    `quick=True` runs only a few iterations of each, as a smoke test. `select` only runs
+    the benchmarks whose names contain it.
+    """
+    patch_typeguard()
+    results = {}
+    for name, make in _cases().items():
+        if select is not None and select not in name:
+            continue
+        checked, baseline = make()
+        # Warm up, e.g. to build the checking plan and compile anything under JAX.
+        checked()
+        baseline()
+        if quick:
+            number, num_repeat = 10, 1
+        else:
+            # Aim for roughly 0.1 seconds per repeat.
+            number, _ = timeit.Timer(checked).autorange()
+            num_repeat = repeat
+        checked_ns = _time(checked, number, num_repeat)
+        baseline_ns = _time(baseline, number, num_repeat)
+        results[name] = {
+            "checked_ns": checked_ns,
+            "baseline_ns": baseline_ns,
+            "overhead_ns": checked_ns - baseline_ns,
+        }
+    return {
+        "metadata": {
+            "jaxtyping": __version__,
+            "jax": jax.__version__,
+            "typeguard": getattr(typeguard, "__version__", None),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    *,
+    tolerance: float = 0.25,
+    min_difference_ns: float = 200.0,
+) -> List[str]:
+    """Compares two sets of results from `run`, returning a description of each
+    benchmark whose checking overhead has regressed.
+
+    A regression is an overhead more than `tolerance` (as a fraction) above the
+    baseline, and also more than `min_difference_ns` above it, so that timing noise on
+    very cheap benchmarks isn't reported. Benchmarks missing from either set are
+    ignored.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        try:
+            old = baseline["results"][name]["overhead_ns"]
+        except KeyError:
+            continue
+        new = result["overhead_ns"]
+        # Overheads that are within noise of zero can come out negative.
+        old = max(old, 0.0)
+        if new > old * (1 + tolerance) and new - old > min_difference_ns:
+            message = f"{name}: overhead {old:.0f}ns -> {new:.0f}ns"
+            if old > 0:
+                message += f" ({(new - old) / old:+.0%})"
+            regressions.append(message)
+    return regressions
+
+
+def run_threaded(
+    thread_counts: List[int] = (1, 2, 4, 8), *, calls: int = 2000
+) -> Dict[str, Any]:
+    """Stress test of checking from multiple threads at once: each thread makes `calls`
+    checked calls, with argument shapes differing between threads. Returns the total
+    throughput for each number of threads, and its speedup over a single thread.
+
+    Throughput can only scale with the number of threads on free-threaded Python: with
+    the GIL, the speedup stays at around 1.
+    """
+    patch_typeguard()
+    annotation = JaxArray["batch":..., "a", "b"]
+    func = typeguard.typechecked(_make_function(4, annotation, annotation))
+    results = {}
+    for num_threads in thread_counts:
+        barrier = threading.Barrier(num_threads + 1)
+        errors = []
+
+        def work(index: int) -> None:
+            args = [jnp.zeros((index + 1, 2, 3))] * 4
+            barrier.wait()
+            try:
+                for _ in range(calls):
+                    func(*args)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=work, args=(index,)) for index in range(num_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        results[str(num_threads)] = {
+            "calls_per_second": num_threads * calls / duration,
+        }
+    single = results[str(thread_counts[0])]["calls_per_second"] / thread_counts[0]
+    for result in results.values():
+        result["speedup"] = result["calls_per_second"] / single
+    return {"gil": getattr(sys, "_is_gil_enabled", lambda: True)(), "threads": results}
+
+
+def _import_source(num_functions: int, decorator: Optional[str]) -> str:
+    # A module of `num_functions` typed functions, as a stand-in for a large typed
+    # codebase.
+    lines = [
+        "import typeguard",
+        "from jaxtyping import JaxArray, checked",
+    ]
+    for i in range(num_functions):
+        if decorator is not None:
+            lines.append(f"@{decorator}")
+        dim = f"d{i % 64}"
+        lines.append(
+            f'def f{i}(x: JaxArray["batch", "{dim}"], y: JaxArray["{dim}"], '
+            f'n: int = 0) -> JaxArray["batch", "{dim}"]:'
+        )
+        lines.append("    return x")
+    return "\n".join(lines) + "\n"
+
+
+def run_import(
+    num_functions: int = 2000, *, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """Measures the start-up cost of checking, for a synthetic module defining
+    `num_functions` typed functions, undecorated or decorated with each of
+    `typeguard.typechecked` and `jaxtyping.checked`.
+
+    For each, returns the time taken to run ("import") the module, and then the time
+    taken to call every function in it once, in milliseconds. JaxArray[...] annotations
+    are created afresh each time, as they would be in a new process.
+    """
+    patch_typeguard()
+    decorators = {
+        "none": None,
+        "typechecked": "typeguard.typechecked",
+        "checked": "checked",
+    }
+    x, y = jnp.zeros((2, 3)), jnp.zeros(3)
+    results = {}
+    for name, decorator in decorators.items():
+        code = compile(_import_source(num_functions, decorator), "<bench>", "exec")
+        import_s = first_call_s = float("inf")
+        for _ in range(repeat):
+            with tensor_type._annotation_cache_lock:
+                tensor_type._annotation_cache.clear()
+            namespace = {}
+            start = time.perf_counter()
+            exec(code, namespace)
+            import_s = min(import_s, time.perf_counter() - start)
+            funcs = [namespace[f"f{i}"] for i in range(num_functions)]
+            start = time.perf_counter()
+            for func in funcs:
+                func(x, y)
+            first_call_s = min(first_call_s, time.perf_counter() - start)
+        results[name] = {
+            "import_ms": import_s * 1e3,
+            "first_call_ms": first_call_s * 1e3,
+        }
+    return results
+
+
+def _format(results: Dict[str, Any]) -> str:
+    lines = [f"{'benchmark':<28}{'checked':>14}{'baseline':>14}{'overhead':>14}"]
+    for name, result in results["results"].items():
+        lines.append(
+            f"{name:<28}"
+            f"{result['checked_ns']:>12.0f}ns"
+            f"{result['baseline_ns']:>12.0f}ns"
+            f"{result['overhead_ns']:>12.0f}ns"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m jaxtyping.bench",
+        description="Benchmark the per-call overhead of jaxtyping's checking.",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Only run a few iterations of each."
+    )
+    parser.add_argument(
+        "-k", dest="select", help="Only run benchmarks whose names contain this."
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Number of repeats.")
+    parser.add_argument("--output", help="Save the results as JSON to this file.")
+    parser.add_argument(
+        "--compare",
+        metavar="BASELINE",
+        help="Compare against results previously saved with --output, exiting with "
+        "a nonzero status if any benchmark has regressed.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Fractional increase in overhead counted as a regression.",
+    )
+    parser.add_argument(
+        "--threads",
+        metavar="N,N,...",
+        help="Instead, run a multithreaded stress test with these numbers of threads.",
+    )
+    parser.add_argument(
+        "--import",
+        dest="num_functions",
+        metavar="N",
+        type=int,
+        help="Instead, measure the time taken to import a module of N typed "
+        "functions, and to call each of them for the first time.",
+    )
+    args = parser.parse_args(argv)
+
+    if args.num_functions is not None:
+        results = run_import(args.num_functions, repeat=1 if args.quick else 5)
+        print(f"{'decorator':<14}{'import':>14}{'first calls':>14}")
+        for name, result in results.items():
+            print(
+                f"{name:<14}{result['import_ms']:>12.1f}ms"
+                f"{result['first_call_ms']:>12.1f}ms"
+            )
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    if args.threads is not None:
+        thread_counts = [int(n) for n in args.threads.split(",")]
+        results = run_threaded(thread_counts, calls=100 if args.quick else 2000)
+        print(f"GIL enabled: {results['gil']}")
+        print(f"{'threads':<10}{'calls/s':>14}{'speedup':>10}")
+        for num_threads, result in results["threads"].items():
+            print(
+                f"{num_threads:<10}{result['calls_per_second']:>14.0f}"
+                f"{result['speedup']:>10.2f}"
+            )
+        if args.output is not None:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    results = run(quick=args.quick, select=args.select, repeat=args.repeat)
+    print(_format(results))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, tolerance=args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print("  " + regression)
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
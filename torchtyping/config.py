@@ -0,0 +1,154 @@
+import os
+import threading
+import types
+
+from typing import Any, Callable, Dict, Optional, TypeVar, Union
+
+_T = TypeVar("_T")
+
+# Every option, and its default value.
+_defaults = {
+    # The number of distinct argument signatures -- the (type, shape, dtype) of each
+    # JaxArray argument -- to remember per function. Calls whose signature has already
+    # passed checking skip the array checks. 0 disables the cache.
+    "signature_cache_size": 0,
+    # Only check every `check_every`-th call of each function.
+    "check_every": 1,
+    # Once this many checked calls of a function in a row have passed, double the
+    # interval between checked calls with every further pass. 0 disables this.
+    "backoff_after": 0,
+    # The largest interval between checked calls that backing off can reach.
+    "backoff_max_interval": 1024,
+    # How the items yielded by a generator are checked. "independent": each item is
+    # checked against the dimension sizes bound by the arguments. "stream": dimension
+    # sizes bound by the first item also stay fixed for the rest of the stream.
+    "yield_dims": "independent",
+    # Names of dimensions that may change size from item to item, even in "stream" mode.
+    "per_yield_dims": (),
+    # Only check every `check_yield_every`-th item yielded by a generator.
+    "check_yield_every": 1,
+    # Only record the type, shape and dtype of each JaxArray argument and return value,
+    # and check them in a background thread. Failures are raised at the next call to
+    # the same function, or by `jaxtyping.sync_checks()`.
+    "deferred": False,
+    # Remember (by weak reference) the arrays that have passed each JaxArray[...]
+    # annotation, and don't check them again. Their dimension sizes are still bound.
+    "identity_cache": False,
+}
+
+# The minimum value of each integer-valued option.
+_minimums = {
+    "signature_cache_size": 0,
+    "check_every": 1,
+    "backoff_after": 0,
+    "backoff_max_interval": 1,
+    "check_yield_every": 1,
+}
+
+# The options that are either True or False.
+_booleans = ("deferred", "identity_cache")
+
+# The allowed values of each option with a fixed set of values.
+_choices = {"yield_dims": ("independent", "stream")}
+
+# Set via the JAXTYPING_DISABLE environment variable, which is read once, when jaxtyping
+# is imported. When disabled, `JaxArray[...]` just returns `JaxArray`, and
+# `patch_typeguard` and `typed_jit` don't add any checking at all.
+_disabled = os.environ.get("JAXTYPING_DISABLE", "").lower() not in ("", "0", "false")
+
+_global_options: Dict[str, Any] = {}
+_module_options: Dict[str, Dict[str, Any]] = {}
+# Incremented whenever the options change, so that anything computed from them (like
+# the per-function check plans) knows to recompute itself.
+_version = 0
+_lock = threading.Lock()
+
+
+def _validate(options: Dict[str, Any]) -> None:
+    for key, value in options.items():
+        if key not in _defaults:
+            raise TypeError(f"Unknown jaxtyping option '{key}'.")
+        if key in _minimums:
+            minimum = _minimums[key]
+            if not isinstance(value, int) or isinstance(value, bool) or value < minimum:
+                raise ValueError(
+                    f"{key} must be an integer of at least {minimum}, got {value!r}."
+                )
+        if key in _booleans and not isinstance(value, bool):
+            raise ValueError(f"{key} must be True or False, got {value!r}.")
+        if key in _choices and value not in _choices[key]:
+            raise ValueError(f"{key} must be one of {_choices[key]}, got {value!r}.")
+        if key == "per_yield_dims" and (
+            isinstance(value, str)
+            or not isinstance(value, (list, tuple, set, frozenset))
+            or not all(isinstance(name, str) for name in value)
+        ):
+            raise ValueError(
+                f"per_yield_dims must be a collection of dimension names, got "
+                f"{value!r}."
+            )
+
+
+def set_options(module: Union[None, str, types.ModuleType] = None, **options) -> None:
+    """Sets jaxtyping's checking options.
+
+    If `module` is passed (as a module or as its name) then the options only apply to
+    the functions defined in that module, or in that package and its submodules. Else
+    they apply globally. Per-function options (see `jaxtyping.options`) take precedence
+    over per-module options, which take precedence over global options.
+    """
+    global _version
+    _validate(options)
+    if isinstance(module, types.ModuleType):
+        module = module.__name__
+    with _lock:
+        if module is None:
+            _global_options.update(options)
+        else:
+            _module_options.setdefault(module, {}).update(options)
+        _version += 1
+
+
+def reset_options() -> None:
+    """Resets every global and per-module option to its default."""
+    global _version
+    with _lock:
+        _global_options.clear()
+        _module_options.clear()
+        _version += 1
+
+
+def options(**options) -> Callable[[_T], _T]:
+    """Decorator setting jaxtyping's checking options for a single function. It should
+    be placed beneath `@typeguard.typechecked`:
+    ```
+    @typechecked
+    @jaxtyping.options(signature_cache_size=16)
+    def f(x: JaxArray["batch"]):
+        ...
+    ```
+    """
+    _validate(options)
+
+    def decorator(func: _T) -> _T:
+        func.__jaxtyping_options__ = {
+            **getattr(func, "__jaxtyping_options__", {}),
+            **options,
+        }
+        return func
+
+    return decorator
+
+
+def _resolve(func: Optional[Callable]) -> Dict[str, Any]:
+    resolved = dict(_defaults)
+    module = getattr(func, "__module__", None) or ""
+    with _lock:
+        resolved.update(_global_options)
+        # Sorted so that options for a package are applied before options for its
+        # submodules.
+        for name in sorted(_module_options, key=len):
+            if module == name or module.startswith(name + "."):
+                resolved.update(_module_options[name])
+    resolved.update(getattr(func, "__jaxtyping_options__", {}))
+    return resolved
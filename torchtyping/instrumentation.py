@@ -0,0 +1,235 @@
+"""Opt-in instrumentation of how much checking each typechecked function does.
+
+```
+jaxtyping.instrumentation.enable()
+...  # call some typechecked functions
+print(jaxtyping.instrumentation.snapshot())
+```
+"""
+
+import threading
+import weakref
+
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+# Whether instrumentation is on. The patched typeguard functions look at this once per
+# check, and do no other work at all for instrumentation when it is off.
+_enabled = False
+# Callbacks and span hooks are replaced rather than mutated, so that they can be
+# iterated over without locking.
+_callbacks: List[Callable[[str, str, float, float, bool], Any]] = []
+_span_hooks: List[Callable[[str, str], ContextManager]] = []
+# Keyed by the (undecorated) function being checked. Every update is made with `_lock`,
+# as checks may happen in multiple threads at once.
+_stats = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class _FunctionStats:
+    __slots__ = (
+        "name",
+        "checks",
+        "failures",
+        "time",
+        "max_time",
+        "memo_time",
+        "max_memo_time",
+        "cache_hits",
+        "cache_misses",
+        "skipped",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        # The number of argument and return checks, and how many of those failed.
+        self.checks = 0
+        self.failures = 0
+        # Time spent checking, in seconds: in total, and in _check_memo specifically.
+        self.time = 0.0
+        self.max_time = 0.0
+        self.memo_time = 0.0
+        self.max_memo_time = 0.0
+        # Signature cache lookups (see the `signature_cache_size` option).
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Calls skipped by sampling (see the `check_every` option).
+        self.skipped = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.__slots__ if key != "name"}
+
+
+def _name(func: Callable) -> str:
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None) or repr(func)
+    return qualname if module is None else f"{module}.{qualname}"
+
+
+def _get(func: Callable) -> _FunctionStats:
+    # Must be called with `_lock` held.
+    try:
+        return _stats[func]
+    except KeyError:
+        stats = _stats[func] = _FunctionStats(_name(func))
+        return stats
+
+
+def _record(func: Callable, phase: str, start: float, duration: float, failed: bool):
+    # `phase` is either "arguments" or "return".
+    with _lock:
+        stats = _get(func)
+        stats.checks += 1
+        stats.failures += failed
+        stats.time += duration
+        stats.max_time = max(stats.max_time, duration)
+    for callback in _callbacks:
+        callback(stats.name, phase, start, duration, failed)
+
+
+def _enter_spans(func: Callable, phase: str) -> Optional[List[ContextManager]]:
+    if len(_span_hooks) == 0:
+        return None
+    with _lock:
+        name = _get(func).name
+    spans = []
+    for hook in _span_hooks:
+        span = hook(name, phase)
+        span.__enter__()
+        spans.append(span)
+    return spans
+
+
+def _exit_spans(spans: Optional[List[ContextManager]]):
+    if spans is not None:
+        for span in reversed(spans):
+            span.__exit__(None, None, None)
+
+
+def _record_memo(func: Callable, duration: float):
+    with _lock:
+        stats = _get(func)
+        stats.memo_time += duration
+        stats.max_memo_time = max(stats.max_memo_time, duration)
+
+
+def _record_cache(func: Callable, hit: bool):
+    with _lock:
+        stats = _get(func)
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+def _record_skip(func: Callable):
+    with _lock:
+        _get(func).skipped += 1
+
+
+def enable() -> None:
+    """Starts recording statistics about the checks performed by each typechecked
+    function, and calling any registered callbacks."""
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    """Stops recording statistics. Those recorded so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Forgets all statistics recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Returns the statistics recorded so far, as a dictionary mapping the qualified
+    name of each checked function to a dictionary with entries:
+
+    - `checks`: the number of times its arguments or return value were checked.
+    - `failures`: the number of those checks that raised an error.
+    - `time`, `max_time`: the total and maximum time spent in a single check, in
+        seconds.
+    - `memo_time`, `max_memo_time`: the same, counting just the time spent checking
+        that dimension sizes are consistent between arrays.
+    - `cache_hits`, `cache_misses`: lookups in the signature cache, if it's enabled.
+    - `skipped`: the number of calls that weren't checked due to sampling, if it's
+        enabled.
+
+    Distinct functions with the same qualified name are combined.
+    """
+    out = {}
+    with _lock:
+        for stats in _stats.values():
+            _merge(out, {stats.name: stats.as_dict()})
+    return out
+
+
+def _merge(out: Dict[str, Dict[str, Any]], snapshot: Dict[str, Dict[str, Any]]):
+    # Merges the statistics in `snapshot` into `out`, in-place.
+    for name, stats in snapshot.items():
+        old = out.get(name)
+        if old is None:
+            out[name] = dict(stats)
+        else:
+            for key, value in stats.items():
+                if key.startswith("max_"):
+                    old[key] = max(old[key], value)
+                else:
+                    old[key] += value
+
+
+def add_callback(callback: Callable[[str, str, float, float, bool], Any]) -> None:
+    """Registers `callback(name, phase, start, duration, failed)` to be called after
+    every check while instrumentation is enabled.
+
+    - `name` is the qualified name of the checked function.
+    - `phase` is either `"arguments"` or `"return"`.
+    - `start` is when the check started, as given by `time.perf_counter()`.
+    - `duration` is how long the check took, in seconds.
+    - `failed` is whether the check raised an error.
+
+    Callbacks should not raise exceptions. They may be called from multiple threads at
+    once, if checking happens in multiple threads.
+    """
+    global _callbacks
+    with _lock:
+        _callbacks = _callbacks + [callback]
+
+
+def remove_callback(callback: Callable[[str, str, float, float, bool], Any]) -> None:
+    """Unregisters a callback registered with `add_callback`."""
+    global _callbacks
+    with _lock:
+        callbacks = list(_callbacks)
+        callbacks.remove(callback)
+        _callbacks = callbacks
+
+
+def add_span_hook(hook: Callable[[str, str], ContextManager]) -> None:
+    """Registers `hook(name, phase)`, which should return a context manager. While
+    instrumentation is enabled, every check is performed inside a context manager
+    returned by this hook. `name` and `phase` are as for `add_callback`.
+
+    For example `jax.profiler.TraceAnnotation` can be used as a hook, so that checks
+    show up in the JAX profiler. (See `jaxtyping.tracing.jax_annotations`.)
+    """
+    global _span_hooks
+    with _lock:
+        _span_hooks = _span_hooks + [hook]
+
+
+def remove_span_hook(hook: Callable[[str, str], ContextManager]) -> None:
+    """Unregisters a hook registered with `add_span_hook`."""
+    global _span_hooks
+    with _lock:
+        span_hooks = list(_span_hooks)
+        span_hooks.remove(hook)
+        _span_hooks = span_hooks
@@ -0,0 +1,128 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+
+from .pytree import _flatten_spec
+from .typechecker import _check_array, _check_memo, _Memo
+
+from typing import Any, Iterable, Iterator
+
+
+class _SpecChecker:
+    # Checks batches against a `JaxArray[...]` annotation, or a pytree of them.
+    # Dimension names are shared between the arrays of a single batch, but not between
+    # batches.
+    def __init__(self, spec: Any):
+        self.treedef, self.leaves = _flatten_spec(spec)
+
+    def check(self, index: int, batch: Any) -> Any:
+        try:
+            values = self.treedef.flatten_up_to(batch)
+        except (TypeError, ValueError) as exc:
+            raise TypeError(
+                f"batch {index} does not match the structure of the spec: {exc}"
+            ) from None
+        memo = _Memo()
+        try:
+            for (path, annotation), value in zip(self.leaves, values):
+                if annotation is not None:
+                    base_cls, metadata = annotation
+                    _check_array(
+                        f"batch {index}{path}", value, base_cls, metadata, memo
+                    )
+            _check_memo(memo)
+        except TypeError as exc:  # suppress long traceback
+            raise TypeError(*exc.args) from None
+        return batch
+
+
+# Sentinels passed from the thread pulling from the iterable to the consumer.
+_end = object()
+_source_error = collections.namedtuple("_source_error", ["exception"])
+
+
+def checked_prefetch(
+    iterable: Iterable, spec: Any, *, buffer_size: int = 2, workers: int = 1
+) -> Iterator:
+    """Iterates over `iterable`, pulling up to `buffer_size` items ahead of the
+    consumer, and checking each item against `spec` on a pool of `workers` threads.
+    This moves both loading and checking off the critical path: for example, they can
+    overlap with device computation in a training loop.
+
+    `spec` is either a `JaxArray[...]` annotation or a pytree of them, such as
+    `{"images": JaxArray["batch", 3, "h", "w"], "labels": JaxArray["batch"]}`. Each
+    item must have the same pytree structure as `spec`. Dimension names are shared
+    between the arrays of a single item, but not between items. Leaves of the spec can
+    also be `typing.Any`, meaning that leaf isn't checked.
+
+    Items are produced in order. If an item fails its check, then the `TypeError` is
+    raised when that item would have been produced. Likewise any exception raised by
+    `iterable` itself.
+
+    Loading starts once iteration starts, and stops once the returned iterator is
+    exhausted, closed, or garbage collected.
+    """
+    if buffer_size < 1:
+        raise ValueError(f"buffer_size must be at least 1, got {buffer_size}.")
+    if workers < 1:
+        raise ValueError(f"workers must be at least 1, got {workers}.")
+    checker = _SpecChecker(spec)
+    return _prefetch(iter(iterable), checker, buffer_size, workers)
+
+
+def _prefetch(
+    iterator: Iterator, checker: _SpecChecker, buffer_size: int, workers: int
+) -> Iterator:
+    # Futures for the pending checks, in order. Bounded, so that the loading thread
+    # only gets `buffer_size` items ahead of the consumer.
+    pending = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(workers)
+
+    def put(item) -> bool:
+        # Returns False if the consumer has gone away in the meantime.
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def load():
+        index = 0
+        try:
+            for batch in iterator:
+                if not put(executor.submit(checker.check, index, batch)):
+                    return
+                index += 1
+        except BaseException as e:
+            put(_source_error(e))
+        else:
+            put(_end)
+
+    loader = threading.Thread(target=load, daemon=True)
+    loader.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _end:
+                return
+            if isinstance(item, _source_error):
+                raise item.exception
+            yield item.result()
+    finally:
+        stop.set()
+        # Unblock the loading thread if it's waiting for space, and skip any checks
+        # that haven't started.
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, concurrent.futures.Future):
+                item.cancel()
+        # Doesn't wait for the loading thread, which may be partway through pulling
+        # the next item from `iterator`. It'll stop once it's done that.
+        executor.shutdown(wait=False)
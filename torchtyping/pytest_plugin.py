@@ -1,3 +1,6 @@
+import pytest
+
+from . import instrumentation
 from .typechecker import patch_typeguard
 
 
@@ -8,8 +11,81 @@ def pytest_addoption(parser):
         action="store_true",
         help="Run jaxtyping's typeguard patch.",
     )
+    group.addoption(
+        "--jaxtyping-durations",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Show the N typechecked functions with the most checking time, and with "
+        "the most checks (N=0 for all).",
+    )
+
+
+# Statistics sent back by each pytest-xdist worker.
+_worker_snapshots = []
 
 
 def pytest_configure(config):
     if config.getoption("jaxtyping_patch_typeguard"):
         patch_typeguard()
+    if config.getoption("jaxtyping_durations") is not None:
+        _worker_snapshots.clear()
+        instrumentation.reset()
+        instrumentation.enable()
+
+
+def pytest_unconfigure(config):
+    if config.getoption("jaxtyping_durations") is not None:
+        instrumentation.disable()
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if config.getoption("jaxtyping_durations") is not None and hasattr(
+        config, "workeroutput"
+    ):
+        # Running as a pytest-xdist worker: send our statistics to the controller.
+        config.workeroutput["jaxtyping_durations"] = instrumentation.snapshot()
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    # pytest-xdist hook, called on the controller when a worker finishes.
+    snapshot = getattr(node, "workeroutput", {}).get("jaxtyping_durations")
+    if snapshot is not None:
+        _worker_snapshots.append(snapshot)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    num = config.getoption("jaxtyping_durations")
+    if num is None or hasattr(config, "workeroutput"):
+        return
+    stats = instrumentation.snapshot()
+    for snapshot in _worker_snapshots:
+        instrumentation._merge(stats, snapshot)
+
+    tr = terminalreporter
+    if len(stats) == 0:
+        tr.write_sep("=", "jaxtyping durations")
+        tr.write_line(
+            "No typechecked functions were checked. (Is typeguard patched? See "
+            "--jaxtyping-patch-typeguard.)"
+        )
+        return
+    for key, title in (("time", "most checking time"), ("checks", "most checks")):
+        ranked = sorted(stats.items(), key=lambda item: item[1][key], reverse=True)
+        if num > 0:
+            ranked = ranked[:num]
+            tr.write_sep("=", f"jaxtyping: {num} functions with the {title}")
+        else:
+            tr.write_sep("=", f"jaxtyping: functions with the {title}")
+        tr.write_line(
+            f"{'total':>10} {'max':>10} {'checks':>8} {'failures':>8} {'skipped':>8}"
+            "  function"
+        )
+        for name, s in ranked:
+            tr.write_line(
+                f"{s['time'] * 1000:>8.3f}ms {s['max_time'] * 1000:>8.3f}ms "
+                f"{s['checks']:>8} "
+                f"{s['failures']:>8} {s['skipped']:>8}  {name}"
+            )
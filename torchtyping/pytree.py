@@ -0,0 +1,151 @@
+import jax.tree_util as jtu
+
+from . import config
+from .tensor_type import Annotated
+from .typechecker import (
+    _check_elements,
+    _is_signature_only,
+    _jaxtyping_annotation,
+    _make_array_check,
+)
+from .utils import frozendict
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def _flatten_spec(spec: Any) -> Tuple[Any, List[Tuple[str, Optional[tuple]]]]:
+    # Flattens a pytree whose leaves are JaxArray[...] annotations (or typing.Any, to
+    # not check that leaf). Returns its treedef, and the path and annotation (or None)
+    # of each leaf.
+    try:
+        flatten_with_path = jtu.tree_flatten_with_path
+    except AttributeError:  # older JAX
+        leaves, treedef = jtu.tree_flatten(spec)
+        paths = [f"[{i}]" for i in range(len(leaves))]
+    else:
+        path_leaves, treedef = flatten_with_path(spec)
+        paths = [jtu.keystr(path) for path, _ in path_leaves]
+        leaves = [leaf for _, leaf in path_leaves]
+    out = []
+    for path, leaf in zip(paths, leaves):
+        if leaf is Any:
+            annotation = None
+        else:
+            annotation = _jaxtyping_annotation(leaf)
+            if annotation is None:
+                raise TypeError(
+                    f"The leaves of a spec must be JaxArray[...] annotations (or "
+                    f"typing.Any, to not check that leaf). Got {leaf!r} at "
+                    f"{path or 'the top level'}."
+                )
+        out.append((path, annotation))
+    return treedef, out
+
+
+class _PyTreeSpec:
+    # The checks for a single PyTree[...] annotation, built once when it's created.
+    #
+    # If the spec is a single JaxArray[...] annotation then `treedef` is None, and any
+    # pytree matches as long as every leaf matches. Else `treedef` is the structure that
+    # the value must have, and `leaves` is the (path, check) of each leaf, where `check`
+    # is None for leaves that aren't checked.
+    #
+    # `deduplicate` is whether only one leaf of each (type, shape, dtype) needs to be
+    # checked, which is the case when `treedef` is None and the checks depend on nothing
+    # else.
+    #
+    # `identity_cache` is whether the checks of the leaves use an identity cache (see
+    # the `identity_cache` option). `cached` is the equivalent _PyTreeSpec that does,
+    # once it's been asked for.
+    __slots__ = (
+        "spec",
+        "treedef",
+        "leaves",
+        "descriptions",
+        "deduplicate",
+        "identity_cache",
+        "cached",
+    )
+
+    def __init__(self, spec: Any, identity_cache: bool = False):
+        self.spec = spec
+        self.identity_cache = identity_cache
+        self.cached = self if identity_cache else None
+        annotation = _jaxtyping_annotation(spec)
+        if annotation is None:
+            self.treedef, leaves = _flatten_spec(spec)
+            self.deduplicate = False
+            self.leaves: List[Tuple[str, Optional[Callable]]] = []
+            for path, annotation in leaves:
+                if annotation is None:
+                    check = None
+                else:
+                    check = _make_array_check(*annotation, identity_cache)
+                self.leaves.append((path, check))
+        else:
+            self.treedef = None
+            self.leaves = [("", _make_array_check(*annotation, identity_cache))]
+            self.deduplicate = _is_signature_only(annotation[1])
+        # The description of each leaf, for each description of the whole pytree.
+        # (There's one per argument annotated with this spec.)
+        self.descriptions: Dict[str, List[str]] = {}
+
+    def __repr__(self) -> str:
+        return f"PyTree[{self.spec!r}]"
+
+    def with_identity_cache(self) -> "_PyTreeSpec":
+        if self.cached is None:
+            # Races here are harmless: the spare is just thrown away.
+            self.cached = _PyTreeSpec(self.spec, identity_cache=True)
+        return self.cached
+
+    def check(self, description: str, value: Any, expected_type: Any, memo) -> None:
+        # Called as `check(description, value, expected_type, memo)`, like the checks
+        # of a _CheckPlan. Every leaf is checked with the same `memo`, so dimension
+        # sizes are shared across the whole pytree (and with the other arguments).
+        values, treedef = jtu.tree_flatten(value)
+        if self.treedef is None:
+            _, check = self.leaves[0]
+            if self.deduplicate:
+                _check_elements(f"{description} (leaf ", ")", values, check, memo)
+            else:
+                for index, leaf in enumerate(values):
+                    check(f"{description} (leaf {index})", leaf, None, memo)
+            return
+        if treedef != self.treedef:
+            raise TypeError(
+                f"{description} must have the tree structure {self.treedef}, got "
+                f"{treedef} instead."
+            )
+        try:
+            descriptions = self.descriptions[description]
+        except KeyError:
+            # Races here are harmless: every thread computes the same thing.
+            descriptions = self.descriptions[description] = [
+                f"{description}{path}" for path, _ in self.leaves
+            ]
+        for (_, check), leaf_description, leaf in zip(
+            self.leaves, descriptions, values
+        ):
+            if check is not None:
+                check(leaf_description, leaf, None, memo)
+
+
+class PyTree:
+    """`PyTree[spec]` annotates a pytree of arrays, checked in a single pass.
+
+    `spec` is either a single `JaxArray[...]` annotation, which every leaf of the pytree
+    must match, or a pytree of them, such as
+    `{"w": JaxArray["in", "out"], "b": JaxArray["out"]}`, which the value must match
+    leaf-for-leaf. Leaves of the spec can also be `typing.Any`, meaning that leaf isn't
+    checked. Dimension sizes are shared across the whole pytree, and with every other
+    argument.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        raise RuntimeError(f"Class {cls.__name__} cannot be instantiated.")
+
+    def __class_getitem__(cls, spec: Any) -> Any:
+        if config._disabled:
+            return Any
+        return Annotated[Any, frozendict({"__jaxtyping_pytree__": _PyTreeSpec(spec)})]
@@ -2,17 +2,23 @@ from __future__ import annotations
 
 import abc
 import collections
-import jax.numpy
-import jax.core
+import operator
 
-from typing import Optional, Union
+from .backends import get_backend
 
-JaxArray = Union[jax.numpy.ndarray, jax.core.UnshapedArray]
+from typing import Any, Callable, Optional, Sequence, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    import jax
+
+    JaxArray = Union[jax.numpy.ndarray, jax.core.UnshapedArray]
 
 ellipsis = type(...)
 
 
 class TensorDetail(metaclass=abc.ABCMeta):
+    __slots__ = ()
+
     @abc.abstractmethod
     def __repr__(self) -> str:
         raise NotImplementedError
@@ -26,12 +32,20 @@ class TensorDetail(metaclass=abc.ABCMeta):
     def tensor_repr(cls, tensor: JaxArray) -> str:
         raise NotImplementedError
 
+    def _compile(self) -> Callable[[JaxArray], bool]:
+        # Returns a predicate equivalent to `self.check`. The built-in details override
+        # this to return a closure with everything that doesn't depend on the tensor
+        # already worked out.
+        return self.check
+
 
 _no_name = object()
 
 
 # inheriting from typing.NamedTuple crashes typeguard
 class _Dim(collections.namedtuple("_Dim", ["name", "size"])):
+    __slots__ = ()
+
     # None corresponds to a name not being set. no_name corresponds to us not caring
     # whether a name is set.
     name: Union[None, str, type(_no_name)]
@@ -54,70 +68,124 @@ class _Dim(collections.namedtuple("_Dim", ["name", "size"])):
                 return f"{self.name}: {self.size}"
 
 
+def _dims_repr(dims: Sequence) -> str:
+    # `dims` may be either _Dims or plain sizes.
+    if len(dims) == 0:
+        return "()"
+    elif len(dims) == 1:
+        return repr(dims[0])
+    else:
+        return repr(tuple(dims))[1:-1]
+
+
 class ShapeDetail(TensorDetail):
-    def __init__(self, *, dims: list[_Dim], check_names: bool, **kwargs) -> None:
+    # Immutable, with everything that doesn't depend on the tensor being checked
+    # computed once, here. In particular the `...` only ever occur to the left of every
+    # other dimension, so the dimensions to the right of the `...` ("trailing"
+    # dimensions) are always at the same position relative to the end of the shape.
+    __slots__ = (
+        "dims",
+        "check_names",
+        # Whether there are any `...`.
+        "_has_ellipsis",
+        # The number of dimensions that aren't `...`. (So the exact number of
+        # dimensions if `_has_ellipsis` is False, and the minimum number otherwise.)
+        "_ndim",
+        # The positions (counted from the end of the shape) and sizes of the trailing
+        # dimensions of fixed size.
+        "_fixed_indices",
+        "_fixed_sizes",
+        # The names of the `...`, from left to right. (`_no_name` if unnamed.)
+        "_groups",
+        "_num_trailing",
+        # The trailing dimensions that bind names, from right to left, as
+        # `(index, name, names)` with `index` counted from the end of the shape.
+        "_named_trailing",
+        "_check_shape",
+        "_hash",
+    )
+
+    def __init__(self, *, dims: Sequence[_Dim], check_names: bool, **kwargs) -> None:
         super().__init__(**kwargs)
-        self.dims = dims
         if check_names:
             raise TypeError("There are no named JaxArrays.")
-        self.check_names = check_names
+        dims = tuple(dims)
+        num_leading = 0
+        for index, dim in enumerate(dims):
+            if dim.size is ...:
+                num_leading = index + 1
+        trailing = dims[num_leading:]
+        fixed_indices = []
+        fixed_sizes = []
+        named_trailing = []
+        for index, dim in enumerate(reversed(trailing)):
+            index = -index - 1
+            if not isinstance(dim.size, str) and dim.size != -1:
+                fixed_indices.append(index)
+                fixed_sizes.append(dim.size)
+            if dim.name not in (None, _no_name):
+                if isinstance(dim.size, str):
+                    names = (dim.name, dim.size)
+                else:
+                    names = (dim.name,)
+                named_trailing.append((index, dim.name, names))
+
+        setattr = object.__setattr__
+        setattr(self, "dims", dims)
+        setattr(self, "check_names", check_names)
+        setattr(self, "_has_ellipsis", num_leading > 0)
+        setattr(self, "_ndim", sum(1 for dim in dims if dim.size is not ...))
+        setattr(self, "_fixed_indices", tuple(fixed_indices))
+        setattr(self, "_fixed_sizes", tuple(fixed_sizes))
+        setattr(self, "_groups", tuple(dim.name for dim in dims if dim.size is ...))
+        setattr(self, "_num_trailing", len(trailing))
+        setattr(self, "_named_trailing", tuple(named_trailing))
+        setattr(self, "_check_shape", _compile_shape_check(self))
+        setattr(self, "_hash", hash((type(self), dims, check_names)))
+
+    def __setattr__(self, name, value):
+        raise RuntimeError(f"Cannot modify a {type(self)}.")
+
+    def __delattr__(self, name):
+        raise RuntimeError(f"Cannot modify a {type(self)}.")
+
+    def __eq__(self, other) -> bool:
+        return (
+            type(self) is type(other)
+            and self.dims == other.dims
+            and self.check_names == other.check_names
+        )
+
+    def __hash__(self) -> int:
+        return self._hash
 
     def __repr__(self) -> str:
-        if len(self.dims) == 0:
-            out = "()"
-        elif len(self.dims) == 1:
-            out = repr(self.dims[0])
-        else:
-            out = repr(tuple(self.dims))[1:-1]
+        out = _dims_repr(self.dims)
         if self.check_names:
             out += ", is_named"
         return out
 
     def check(self, tensor: JaxArray) -> bool:
-        self_names = [self_dim.name for self_dim in self.dims]
-        self_shape = [self_dim.size for self_dim in self.dims]
+        return self._check_shape(tensor.shape)
 
-        if ... in self_shape:
-            if sum(1 for size in self_shape if size is not ...) > len(tensor.shape):
-                return False
-        else:
-            if len(self_shape) != len(tensor.shape):
-                return False
-
-        for self_name, self_size, tensor_size in zip(
-            reversed(self_names),
-            reversed(self_shape),
-            reversed(tensor.shape),
-        ):
-            if self_size is ...:
-                break
-
-            if (
-                self.check_names
-                and self_name is not _no_name
-                and self_name != tensor_name
-            ):
-                return False
-            if not isinstance(self_size, str) and self_size not in (-1, tensor_size):
-                return False
-
-        return True
+    def _compile(self) -> Callable[[JaxArray], bool]:
+        check_shape = self._check_shape
+
+        def check(tensor: JaxArray) -> bool:
+            return check_shape(tensor.shape)
+
+        return check
 
     @classmethod
     def tensor_repr(cls, tensor: JaxArray) -> str:
-        dims = []
-        # check_names = any(name is not None for name in tensor.names)
-        check_names = False
-        for size in tensor.shape:
-            if not check_names:
-                name = _no_name
-            dims.append(_Dim(name=name, size=size))
-        return repr(cls(dims=dims, check_names=check_names))
+        # Equivalent to the repr of a ShapeDetail whose dims are all `_no_name`, fixed
+        # size. (JaxArrays have no names.)
+        return _dims_repr(tuple(tensor.shape))
 
     def update(
         self,
         *,
-        dims: Optional[list[_Dim]] = None,
+        dims: Optional[Sequence[_Dim]] = None,
         check_names: Optional[bool] = None,
         **kwargs,
     ) -> ShapeDetail:
@@ -127,10 +195,20 @@ class ShapeDetail(TensorDetail):
 
 
 class DtypeDetail(TensorDetail):
-    def __init__(self, *, dtype, **kwargs) -> None:
+    def __init__(self, *, dtype, backend: str = "jax", **kwargs) -> None:
         super().__init__(**kwargs)
-        assert isinstance(dtype, (jax.numpy.dtype, type(jax.numpy.int32)))
-        self.dtype = dtype
+        # `float` stands for the default floating point dtype of `backend`. (For JAX
+        # this depends on whether 64-bit mode is enabled.) So it's only looked up once
+        # it's needed.
+        assert dtype is float or get_backend(backend).is_dtype(dtype)
+        self._dtype = dtype
+        self._backend = backend
+
+    @property
+    def dtype(self):
+        if self._dtype is float:
+            return get_backend(self._backend).default_float_dtype()
+        return self._dtype
 
     def __repr__(self) -> str:
         return repr(self.dtype)
@@ -138,9 +216,17 @@ class DtypeDetail(TensorDetail):
     def check(self, tensor: JaxArray) -> bool:
         return self.dtype == tensor.dtype
 
+    def _compile(self) -> Callable[[JaxArray], bool]:
+        dtype = self.dtype
+
+        def check(tensor: JaxArray) -> bool:
+            return dtype == tensor.dtype
+
+        return check
+
     @classmethod
     def tensor_repr(cls, tensor: JaxArray) -> str:
-        return repr(cls(dtype=tensor.dtype))
+        return repr(tensor.dtype)
 
 
 class _FloatDetail(TensorDetail):
@@ -171,5 +257,86 @@ class _NamedTensorDetail(TensorDetail):
         raise RuntimeError
 
 
+def _compile_shape_check(detail: ShapeDetail) -> Callable[[tuple], bool]:
+    # Builds a predicate on `tensor.shape` with the number of dimensions and the fixed
+    # sizes baked in. Only the dimensions to the right of the rightmost `...` are
+    # checked individually; named dimensions are checked for consistency between
+    # arguments in _check_memo instead.
+    ndim = detail._ndim
+    fixed_indices = detail._fixed_indices
+    fixed_sizes = detail._fixed_sizes
+
+    if len(fixed_indices) == 0:
+        if detail._has_ellipsis:
+
+            def check_shape(shape: tuple) -> bool:
+                return len(shape) >= ndim
+
+        else:
+
+            def check_shape(shape: tuple) -> bool:
+                return len(shape) == ndim
+
+        return check_shape
+
+    if len(fixed_indices) == 1:
+        (index,) = fixed_indices
+        (size,) = fixed_sizes
+
+        def get_fixed(shape: tuple) -> int:
+            return shape[index]
+
+        fixed = size
+    else:
+        # Gathers every fixed-size dimension at once, for a single tuple comparison.
+        get_fixed = operator.itemgetter(*fixed_indices)
+        fixed = fixed_sizes
+
+    if detail._has_ellipsis:
+
+        def check_shape(shape: tuple) -> bool:
+            return len(shape) >= ndim and get_fixed(shape) == fixed
+
+    else:
+
+        def check_shape(shape: tuple) -> bool:
+            return len(shape) == ndim and get_fixed(shape) == fixed
+
+    return check_shape
+
+
+def _compile_details(details: Sequence[TensorDetail]) -> Callable[[JaxArray], bool]:
+    # Fuses the checks of every detail of a single JaxArray[...] annotation into one
+    # predicate.
+    checks = tuple(detail._compile() for detail in details)
+    if len(checks) == 1:
+        return checks[0]
+    elif len(checks) == 2:
+        check1, check2 = checks
+
+        def check(tensor: JaxArray) -> bool:
+            return check1(tensor) and check2(tensor)
+
+    else:
+
+        def check(tensor: JaxArray) -> bool:
+            for check_i in checks:
+                if not check_i(tensor):
+                    return False
+            return True
+
+    return check
+
+
 is_float = _FloatDetail()  # singleton flag
 is_named = _NamedTensorDetail()  # singleton flag
+
+
+def __getattr__(name: str) -> Any:
+    # `JaxArray` is only needed for annotations, and isn't worth importing JAX for when
+    # this module is imported. (Type checkers get it from the TYPE_CHECKING block.)
+    if name == "JaxArray":
+        import jax
+
+        return Union[jax.numpy.ndarray, jax.core.UnshapedArray]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import abc
 import sys
-import jax.numpy as jnp
+import threading
 
+from . import backends, config
 from .tensor_details import (
     _Dim,
     _no_name,
@@ -13,7 +15,7 @@ from .tensor_details import (
 )
 from .utils import frozendict
 
-from typing import Any, NoReturn
+from typing import Any, NoReturn, TYPE_CHECKING
 
 # Annotated is available in python version 3.9 (PEP 593)
 if sys.version_info >= (3, 9):
@@ -24,11 +26,12 @@ else:
     from typing_extensions import Annotated
 
 # Not Type[Annotated...] as we want to use this in instance checks.
-_AnnotatedType = type(Annotated[jnp.ndarray, ...])
+_AnnotatedType = type(Annotated[int, ...])
 
 
 # For use when we have a plain JaxArray, without any [].
-class _JaxArrayMeta(type(jnp.ndarray)):
+# (An ABCMeta as that's the metaclass of jax.Array.)
+class _JaxArrayMeta(abc.ABCMeta):
     def __instancecheck__(cls, obj: Any) -> bool:
         return isinstance(obj, cls.base_cls)
 
@@ -66,24 +69,53 @@ class JaxArrayMixin(metaclass=_JaxArrayMeta):
         else:
             cls._type_error(item_i)
 
-    @staticmethod
-    def _convert_dtype_element(item_i: Any) -> jnp.dtype:
+    @classmethod
+    def _convert_dtype_element(cls, item_i: Any) -> Any:
         if item_i is int:
-            return jnp.dtype("int64")
+            return backends.get_backend(cls.backend).int_dtype
         elif item_i is float:
-            return jnp.ones(()).dtype
+            # Resolved by DtypeDetail once it's needed, so as not to e.g. initialise a
+            # JAX backend here.
+            return float
         elif item_i is bool:
-            return jnp.dtype("bool")
+            return backends.get_backend(cls.backend).bool_dtype
         else:
             return item_i
 
     def __class_getitem__(cls, item: Any) -> _AnnotatedType:
+        if config._disabled:
+            return cls
         if isinstance(item, tuple):
             if len(item) == 0:
                 item = ((),)
         else:
             item = (item,)
 
+        # Identical annotations share a single object, and with it their compiled
+        # checks.
+        key = (cls, tuple(_cache_key(item_i) for item_i in item))
+        try:
+            out = _annotation_cache[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable, e.g. a custom TensorDetail
+            return cls._getitem(item)
+        else:
+            return out
+        out = cls._getitem(item)
+        with _annotation_cache_lock:
+            # Another thread may have got here first. Use its annotation, so that
+            # equal annotations are always the same object.
+            out = _annotation_cache.setdefault(key, out)
+            if len(_annotation_cache) > _annotation_cache_size:
+                # Evict the oldest annotation. (Not the least recently used one, as
+                # keeping track of that would mean writing to the cache on every read.)
+                del _annotation_cache[next(iter(_annotation_cache))]
+        return out
+
+    @classmethod
+    def _getitem(cls, item: tuple) -> _AnnotatedType:
+        backend = backends.get_backend(cls.backend)
         scalar_shape = False
         not_ellipsis = False
         not_named_ellipsis = False
@@ -120,7 +152,7 @@ class JaxArrayMixin(metaclass=_JaxArrayMeta):
                     scalar_shape = True
                 else:
                     cls._type_error(item_i)
-            elif item_i in (int, bool, float) or isinstance(item_i, (jnp.dtype, type(jnp.int32))):
+            elif item_i in (int, bool, float) or backend.is_dtype(item_i):
                 dtypes.append(cls._convert_dtype_element(item_i))
             # elif isinstance(item_i, torch.layout):
             #     layouts.append(item_i)
@@ -146,7 +178,7 @@ class JaxArrayMixin(metaclass=_JaxArrayMeta):
         if len(dtypes) == 0:
             pass
         elif len(dtypes) == 1:
-            pre_details.append(DtypeDetail(dtype=dtypes[0]))
+            pre_details.append(DtypeDetail(dtype=dtypes[0], backend=cls.backend))
         else:
             raise TypeError("Cannot have multiple dtypes.")
 
@@ -169,7 +201,65 @@ class JaxArrayMixin(metaclass=_JaxArrayMeta):
         ]
 
 
-# Inherit from jnp.ndarray so that IDEs are happy to find methods on functions
-# annotated as JaxArrays.
-class JaxArray(jnp.ndarray, JaxArrayMixin):
-    base_cls = jnp.ndarray
+def _cache_key(item_i: Any) -> Any:
+    # Tagged with the type so that e.g. `1` and `True`, which compare equal, don't share
+    # a cache entry.
+    if isinstance(item_i, slice):
+        return (
+            slice,
+            _cache_key(item_i.start),
+            _cache_key(item_i.stop),
+            _cache_key(item_i.step),
+        )
+    return type(item_i), item_i
+
+
+# The annotations produced by JaxArray[...], keyed by the arguments to [].
+# Read without locking; written with `_annotation_cache_lock`. Reads never change it,
+# so that they're safe against concurrent writes even without the GIL.
+_annotation_cache = {}
+_annotation_cache_size = 4096
+_annotation_cache_lock = threading.Lock()
+
+
+# The class of the annotations for each backend's arrays, named as in
+# `backends._array_classes`. Each inherits from its backend's array class, so that IDEs
+# are happy to find methods on functions annotated with it. They're only created once
+# they're first used, so that only the backends actually used are ever loaded. (PEP
+# 562.)
+_array_classes_lock = threading.Lock()
+
+if TYPE_CHECKING:
+    import jax.numpy as jnp
+    import numpy as np
+
+    class JaxArray(jnp.ndarray, JaxArrayMixin):
+        base_cls = jnp.ndarray
+
+    class NumpyArray(np.ndarray, JaxArrayMixin):
+        base_cls = np.ndarray
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        backend_name = backends._array_classes[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    with _array_classes_lock:
+        try:
+            return globals()[name]
+        except KeyError:
+            backend = backends.get_backend(backend_name)
+            cls = _JaxArrayMeta(
+                name,
+                # The mixin first, as e.g. np.ndarray has its own __class_getitem__.
+                (JaxArrayMixin, backend.array_type),
+                {
+                    "__module__": __name__,
+                    "__qualname__": name,
+                    "base_cls": backend.array_type,
+                    "backend": backend.name,
+                },
+            )
+            globals()[name] = cls
+            return cls
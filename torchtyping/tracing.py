@@ -0,0 +1,109 @@
+"""Tracing of jaxtyping's checks, so that the time spent checking can be seen on a
+timeline.
+
+```
+with jaxtyping.tracing.ChromeTrace() as trace:
+    ...  # call some typechecked functions
+trace.save("trace.json")  # open in chrome://tracing or https://ui.perfetto.dev
+```
+
+or, to see the checks in the JAX profiler alongside everything else that JAX does:
+
+```
+with jax.profiler.trace("/tmp/jax-trace"), jaxtyping.tracing.jax_annotations():
+    ...
+```
+"""
+
+import contextlib
+import json
+import os
+import threading
+
+import jax.profiler
+
+from . import instrumentation
+
+from typing import Any, Dict, List
+
+
+class ChromeTrace:
+    """Records a span for every argument check and return check, named after the
+    checked function, in the Chrome trace event format.
+
+    Recording happens between `start()` and `stop()`, or within a `with` block.
+    Instrumentation (see `jaxtyping.instrumentation`) is enabled while recording.
+    """
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._was_enabled = None
+
+    def _callback(
+        self, name: str, phase: str, start: float, duration: float, failed: bool
+    ):
+        # Chrome traces measure time in microseconds.
+        self.events.append(
+            {
+                "name": name,
+                "cat": "jaxtyping",
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"phase": phase, "failed": failed},
+            }
+        )
+
+    def start(self) -> None:
+        if self._was_enabled is not None:
+            raise RuntimeError("This trace is already recording.")
+        self._was_enabled = instrumentation.is_enabled()
+        instrumentation.add_callback(self._callback)
+        instrumentation.enable()
+
+    def stop(self) -> None:
+        if self._was_enabled is None:
+            raise RuntimeError("This trace is not recording.")
+        instrumentation.remove_callback(self._callback)
+        if not self._was_enabled:
+            instrumentation.disable()
+        self._was_enabled = None
+
+    def __enter__(self) -> "ChromeTrace":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def save(self, path: str) -> None:
+        """Saves the trace as JSON, to be opened in `chrome://tracing` or Perfetto."""
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+def _trace_annotation(name: str, phase: str) -> jax.profiler.TraceAnnotation:
+    return jax.profiler.TraceAnnotation(name, phase=phase)
+
+
+@contextlib.contextmanager
+def jax_annotations():
+    """Within this context manager, every check is wrapped in a
+    `jax.profiler.TraceAnnotation` named after the checked function. When running under
+    the JAX profiler, checks then appear on the same timeline as XLA execution.
+    Instrumentation (see `jaxtyping.instrumentation`) is enabled within it.
+    """
+    was_enabled = instrumentation.is_enabled()
+    instrumentation.add_span_hook(_trace_annotation)
+    instrumentation.enable()
+    try:
+        yield
+    finally:
+        instrumentation.remove_span_hook(_trace_annotation)
+        if not was_enabled:
+            instrumentation.disable()
@@ -1,31 +1,62 @@
 import functools
 import inspect
-import jax
-import jax.numpy as jnp
+import collections
+import collections.abc
+import queue
 import sys
+import threading
+import time
 import typeguard
+import types
+import warnings
+import weakref
 
-from .tensor_details import _Dim, _no_name, ShapeDetail
+from . import backends, config, instrumentation
+from .tensor_details import (
+    _compile_details,
+    _Dim,
+    _dims_repr,
+    _FloatDetail,
+    _no_name,
+    DtypeDetail,
+    ShapeDetail,
+)
 from .tensor_type import _AnnotatedType
+from .utils import frozendict
 
-from typing import Any, Dict, List, Tuple, Callable, Union, Iterable
+from typing import (
+    Any,
+    Dict,
+    ForwardRef,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Callable,
+    TypeVar,
+    Union,
+)
 
 # get_args is available in python version 3.8
 # get_type_hints with include_extras parameter is available in 3.9 PEP 593.
 if sys.version_info >= (3, 9):
-    from typing import get_type_hints, get_args, Type
+    from typing import get_type_hints, get_args
 else:
-    from typing_extensions import get_type_hints, get_args, Type
+    from typing_extensions import get_type_hints, get_args
 
 
-# IDE-friendly version of the Jax @jit decorator
-@functools.wraps(jax.jit)
+_F = TypeVar("_F", bound=Callable)
+
+
+# IDE-friendly version of the Jax @jit decorator. (JAX is imported here rather than at
+# the top of this module, so that checking NumPy arrays doesn't need JAX.)
 def jit(fun: Callable, **kwargs):
+    import jax
+
     _jitted_fun = jax.jit(fun, **kwargs)
     return functools.wraps(fun)(_jitted_fun)
 
 
-@functools.wraps(jax.jit)
 def typed_jit(fun: Callable, **kwargs):
     """Type-check first and then JIT the resulting function. Has no overhead
     after compilation.
@@ -38,6 +69,10 @@ def typed_jit(fun: Callable, **kwargs):
         ...
     ```
     """
+    import jax
+
+    if config._disabled:
+        return jit(fun, **kwargs)
     _jitted_fun = jax.jit(typeguard.typechecked(fun), **kwargs)
     return functools.wraps(fun)(_jitted_fun)
 
@@ -60,7 +95,9 @@ def typed_jit(fun: Callable, **kwargs):
 # Tuple[List[int]] to List[int] to int, recursively calling `check_type`. By patching
 # `check_type` we can check for our `JaxArray`s and record every value-type pair.
 # (Actually it's a bit more than that: we record some names for use in the error
-# messages.) These are recorded in our enhanced `_CallMemo` object.
+# messages.) These are recorded in our enhanced `_CallMemo` object. Only the shape of
+# each array is recorded, not the array itself, so that the memo never keeps arrays
+# alive: it lives for the whole function call (or for as long as a generator does).
 #
 # (Incidentally we also have to patch typeguard's use of typing.get_type_hints, so that
 # our annotations aren't stripped.)
@@ -71,6 +108,24 @@ def typed_jit(fun: Callable, **kwargs):
 #
 # _check_memo performs the real logic of the checking here. This looks at all the
 # recorded value-type pairs and checks for any inconsistencies.
+#
+# Finally, which annotations are ours doesn't change from call to call. So the first
+# time a function is checked we build a _CheckPlan for it, recording for each annotation
+# how it should be checked: JaxArray[...] annotations are checked directly, annotations
+# with a JaxArray[...] nested somewhere inside go through the patched `check_type`, and
+# everything else goes straight to typeguard's original `check_type`. Functions without
+# any JaxArray[...] annotations skip our machinery altogether.
+#
+# For coroutines, typeguard checks the awaited result using the same memo as the
+# arguments, so that just works. For generators, typeguard checks each item as it is
+# yielded, using our patched `check_type`, but never calls `check_return_type` again.
+# So we also replace typeguard's generator wrappers, to check each item against the
+# dimension sizes bound by the arguments. (See _ItemChecker.)
+#
+# Checking may happen from many threads at once. All per-call state lives on the
+# `_CallMemo`, which typeguard creates afresh for every call. The state shared between
+# calls -- the check plans and their signature caches -- is read without locking, and
+# only writes take a lock. (So that this is also safe without the GIL.)
 
 
 def _to_string(name, detail_reprs: List[str]) -> str:
@@ -85,17 +140,30 @@ def _to_string(name, detail_reprs: List[str]) -> str:
     return string
 
 
+def _compiled_check(metadata: Dict[str, Any]) -> Callable[[Any], bool]:
+    # The checks for each JaxArray[...] annotation are compiled the first time that
+    # annotation is checked, and then cached on its (frozendict) metadata.
+    try:
+        return metadata.compiled_check
+    except AttributeError:
+        check = _compile_details(metadata["details"])
+        if isinstance(metadata, frozendict):
+            metadata.compiled_check = check
+        return check
+
+
 def _check_tensor(
-    argname: str, value: Any, origin: Union[Type[jnp.ndarray], Tuple[Type[jnp.ndarray]]], metadata: Dict[str, Any],
+    argname: str,
+    value: Any,
+    origin: Union[type, Tuple[type, ...]],
+    metadata: Dict[str, Any],
 ):
     details = metadata["details"]
-    if not isinstance(value, origin) or any(
-        not detail.check(value) for detail in details
-    ):
+    if not isinstance(value, origin) or not _compiled_check(metadata)(value):
         expected_string = _to_string(
             metadata["cls_name"], [repr(detail) for detail in details]
         )
-        if isinstance(value, (jnp.ndarray, jax.core.UnshapedArray)):
+        if isinstance(value, origin) or isinstance(value, backends._abstract_types):
             given_string = _to_string(
                 metadata["cls_name"], [detail.tensor_repr(value) for detail in details]
             )
@@ -113,184 +181,1134 @@ def _check_tensor(
         )
 
 
-def _check_memo(memo):
-    ###########
-    # Parse the tensors and figure out the sizes of all labelled
-    # dimensions.
-    # This also performs some (and in practice most) of the consistency
-    # checks. However its job is primarily one of assigning sizes to labels.
-    # The final checking of the inferred sizes is performed afterwards.
+def _jaxtyping_annotation(
+    expected_type: Any,
+) -> Optional[Tuple[type, Dict[str, Any]]]:
+    # If `expected_type` is a JaxArray[...] annotation then returns its base class and
+    # its metadata. Else returns None.
+    if isinstance(expected_type, _AnnotatedType):
+        base_cls, *all_metadata = get_args(expected_type)
+        if isinstance(base_cls, type) and issubclass(base_cls, backends._array_types):
+            for metadata in all_metadata:
+                if isinstance(metadata, dict) and "__torchtyping__" in metadata:
+                    return base_cls, metadata
+    return None
+
+
+def _pytree_annotation(expected_type: Any) -> Optional[Any]:
+    # If `expected_type` is a PyTree[...] annotation then returns its _PyTreeSpec. Else
+    # returns None.
+    if isinstance(expected_type, _AnnotatedType):
+        _, *all_metadata = get_args(expected_type)
+        for metadata in all_metadata:
+            if isinstance(metadata, dict) and "__jaxtyping_pytree__" in metadata:
+                return metadata["__jaxtyping_pytree__"]
+    return None
+
+
+def _contains_jaxtyping(expected_type: Any) -> bool:
+    if _jaxtyping_annotation(expected_type) is not None:
+        return True
+    if _pytree_annotation(expected_type) is not None:
+        return True
+    # Forward references and type variables are only resolved by typeguard at check
+    # time, so we have to assume that they might turn out to be one of ours.
+    if isinstance(expected_type, (str, ForwardRef, TypeVar)):
+        return True
+    if isinstance(expected_type, (list, tuple)):
+        # The arguments of Callable[[...], ...]
+        args = expected_type
+    else:
+        args = get_args(expected_type)
+    return any(_contains_jaxtyping(arg) for arg in args)
+
+
+def _check_array(
+    argname: str,
+    value: Any,
+    base_cls: type,
+    metadata: Dict[str, Any],
+    memo,
+):
+    # We call _check_tensor here -- despite calling _check_tensor again once we've seen
+    # every argument and filled in the shape details -- just because we want to check
+    # that `value` is in fact a tensor before we access its `shape` field later.
+    _check_tensor(argname, value, base_cls, metadata)
+    for detail in metadata["details"]:
+        if isinstance(detail, ShapeDetail):
+            memo.value_info.append((argname, value.shape, metadata["cls_name"], detail))
+            break
+
+
+# Once this many arrays that have passed a single annotation are alive at once, forget
+# them all and start again.
+_max_identity_cache_size = 1 << 16
+
+
+class _IdentityCache:
+    # The arrays that have passed the checks of a single JaxArray[...] annotation, for
+    # the `identity_cache` option. JAX arrays are immutable, so an array that has passed
+    # once will always pass. Arrays are held by weak reference, keyed by id, and removed
+    # once garbage collected. (JAX arrays aren't hashable, so can't be the keys of a
+    # WeakKeyDictionary.) Read without locking; written with `lock`.
+    __slots__ = ("refs", "lock")
+
+    def __init__(self):
+        self.refs: Dict[int, weakref.ref] = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, value: Any) -> bool:
+        ref = self.refs.get(id(value))
+        # The id might have been reused by a new object, before the callback removing
+        # the old one has run.
+        return ref is not None and ref() is value
+
+    def add(self, value: Any) -> None:
+        key = id(value)
+        try:
+            ref = weakref.ref(value, functools.partial(self._remove, key))
+        except TypeError:  # can't be weakly referenced
+            return
+        with self.lock:
+            if len(self.refs) >= _max_identity_cache_size:
+                self.refs.clear()
+            self.refs[key] = ref
+
+    def _remove(self, key: int, ref: weakref.ref) -> None:
+        with self.lock:
+            if self.refs.get(key) is ref:
+                del self.refs[key]
+
+
+_identity_cache_lock = threading.Lock()
+
+
+def _identity_cache(metadata: Dict[str, Any]) -> _IdentityCache:
+    # Cached on the (frozendict) metadata, like _compiled_check, so that every function
+    # using the same annotation shares one identity cache.
+    try:
+        return metadata.identity_cache
+    except AttributeError:
+        cache = _IdentityCache()
+        if isinstance(metadata, frozendict):
+            with _identity_cache_lock:
+                try:
+                    cache = metadata.identity_cache
+                except AttributeError:
+                    metadata.identity_cache = cache
+        return cache
+
+
+def _make_array_check(
+    base_cls: type, metadata: Dict[str, Any], identity_cache: bool = False
+):
+    # As _check_array, but with the lookups done ahead of time. If `identity_cache`,
+    # and the backend's arrays are immutable, then arrays that have already passed are
+    # not checked again. Their dimension sizes still need binding, as they're checked
+    # against the other arrays. Without any `...` this is done straight away, rather
+    # than by _check_memo, which is most of the cost of checking an array.
+    check = _compiled_check(metadata)
+    cls_name = metadata["cls_name"]
+    for shape_detail in metadata["details"]:
+        if isinstance(shape_detail, ShapeDetail):
+            break
+    else:
+        shape_detail = None
+
+    if identity_cache and backends._backend_of(base_cls).immutable:
+        passed = _identity_cache(metadata)
+        # Without any `...`, binding an array's sizes doesn't depend on any other
+        # array's, so can be done in any order.
+        bind_now = shape_detail is not None and len(shape_detail._groups) == 0
+
+        def check_array(argname: str, value: Any, expected_type: Any, memo):
+            if value in passed:
+                if bind_now:
+                    _bind_sizes(argname, value.shape, cls_name, shape_detail, memo)
+                    return
+            else:
+                if not isinstance(value, base_cls) or not check(value):
+                    _check_tensor(argname, value, base_cls, metadata)
+                passed.add(value)
+            if shape_detail is not None:
+                memo.value_info.append((argname, value.shape, cls_name, shape_detail))
+
+    else:
+
+        def check_array(argname: str, value: Any, expected_type: Any, memo):
+            if not isinstance(value, base_cls) or not check(value):
+                _check_tensor(argname, value, base_cls, metadata)
+            if shape_detail is not None:
+                memo.value_info.append((argname, value.shape, cls_name, shape_detail))
+
+    return check_array
+
+
+# The details whose checks depend on nothing but the shape and dtype of the array.
+_signature_details = (ShapeDetail, DtypeDetail, _FloatDetail)
+
+
+def _is_signature_only(metadata: Dict[str, Any]) -> bool:
+    return all(type(detail) in _signature_details for detail in metadata["details"])
+
+
+def _check_elements(
+    prefix: str, suffix: str, values: Iterable, check_array: Callable, memo
+) -> None:
+    # Checks every array in `values` with `check_array` (as made by _make_array_check),
+    # describing the `index`-th one as f"{prefix}{index}{suffix}". Only the first array
+    # of each (type, shape, dtype) is checked, and so only that one binds dimension
+    # sizes: the checks must depend on nothing else. This makes checking a large
+    # container of arrays scale with the number of distinct shapes it has, rather than
+    # with the number of arrays.
+    seen = set()
+    for index, value in enumerate(values):
+        try:
+            key = (type(value), value.shape, value.dtype)
+        except AttributeError:
+            pass  # Not an array, so it'll fail the check below.
+        else:
+            if key in seen:
+                continue
+            seen.add(key)
+        check_array(f"{prefix}{index}{suffix}", value, None, memo)
+
+
+# The origins of the annotations for containers whose elements all have the same type.
+# (For `tuple`, only `Tuple[X, ...]`.)
+_homogeneous_origins = (list, tuple, collections.abc.Sequence)
+
+
+def _homogeneous_annotation(
+    expected_type: Any,
+) -> Optional[Tuple[type, type, Dict[str, Any]]]:
+    # If `expected_type` is `List[X]`, `Sequence[X]` or `Tuple[X, ...]`, where `X` is a
+    # JaxArray[...] annotation using only _signature_details, then returns the container
+    # type, and the base class and metadata of `X`. Else returns None.
+    origin = getattr(expected_type, "__origin__", None)
+    if origin not in _homogeneous_origins:
+        return None
+    args = getattr(expected_type, "__args__", None) or ()
+    if origin is tuple:
+        if len(args) != 2 or args[1] is not ...:
+            return None
+    elif len(args) != 1:
+        return None
+    annotation = _jaxtyping_annotation(args[0])
+    if annotation is None or not _is_signature_only(annotation[1]):
+        return None
+    return (origin, *annotation)
+
+
+def _make_container_check(
+    container_type: type,
+    base_cls: type,
+    metadata: Dict[str, Any],
+    check_plain: Callable,
+    identity_cache: bool = False,
+):
+    # Checks a container annotated as described by _homogeneous_annotation, deferring to
+    # typeguard (as `check_plain`) to report a value that isn't of the container type.
+    check_array = _make_array_check(base_cls, metadata, identity_cache)
+
+    def check_container(argname: str, value: Any, expected_type: Any, memo):
+        if not isinstance(value, container_type):
+            check_plain(argname, value, expected_type, memo)
+        else:
+            _check_elements(f"{argname}[", "]", value, check_array, memo)
+
+    return check_container
+
+
+class _CheckPlan:
+    # How to check each annotation of a single function. Each entry of `arguments` (and
+    # `return_entry`, if there is a return annotation) is a tuple of
+    # `(argname, description, expected_type, check)`, where `check` is called as
+    # `check(description, value, expected_type, memo)`.
     #
-    # This logic is a bit hairy. Most of the complexity comes from
-    # supporting `...` arbitrary numbers of dimensions.
-    ###########
+    # If the function's options ask for it, and every JaxArray annotation is both a
+    # top-level argument annotation and made up only of _signature_details, then
+    # `signature_cache` maps the (type, shape, dtype) of the arrays passed in
+    # `array_argnames` to the dimension sizes inferred from them. A call whose signature
+    # is in the cache can only check the `plain_arguments`. It's read without locking,
+    # and written with `cache_lock`. Once full, roughly the least recently used
+    # signature is evicted: a lookup only adds the signature to `cache_used` (rather
+    # than reordering the cache, which would need the lock), and eviction gives each
+    # signature in `cache_used` a second chance. (The "clock" algorithm.)
+    #
+    # If the function's options ask for only some calls to be checked, then `sampler`
+    # decides which ones.
+    __slots__ = (
+        "arguments",
+        "return_entry",
+        "has_arrays",
+        "version",
+        "array_argnames",
+        "array_arguments",
+        "plain_arguments",
+        "signature_cache",
+        "signature_cache_size",
+        "cache_lock",
+        "cache_used",
+        "sampler",
+        "yield_options",
+        "deferred",
+    )
 
-    # ordered set
-    shape_info = {
-        (argname, value.shape, detail): None
-        for argname, value, _, detail in memo.value_info
-    }
-    while len(shape_info):
-        for argname, shape, detail in shape_info:
-            num_free_ellipsis = 0
-            for dim in detail.dims:
-                if dim.size is ... and dim.name not in memo.name_to_shape:
-                    num_free_ellipsis += 1
-            if num_free_ellipsis <= 1:
-                reversed_shape = enumerate(reversed(shape))
-                for dim in reversed(detail.dims):
-                    try:
-                        reverse_dim_index, size = next(reversed_shape)
-                    except StopIteration:
-                        if dim.size is ...:
-                            if dim.name not in (None, _no_name):
-                                try:
-                                    lookup_shape = memo.name_to_shape[dim.name]
-                                except KeyError:
-                                    memo.name_to_shape[dim.name] = ()
-                                else:
-                                    if lookup_shape != ():
-                                        raise TypeError(
-                                            f"Dimension group '{dim.name}' of "
-                                            f"inconsistent shape. Got both () and "
-                                            f"{lookup_shape}."
-                                        )
-                        else:
-                            # I don't think it's possible to get here, as the earlier
-                            # call to _check_tensor in check_type should catch
-                            # this case.
-                            raise TypeError(
-                                f"{argname} has {len(shape)} dimensions but type "
-                                "requires more than this."
-                            )
-
-                    if dim.name not in (None, _no_name):
-                        if dim.size is ...:
-                            try:
-                                lookup_shape = memo.name_to_shape[dim.name]
-                            except KeyError:
-                                # Can only get here if we're the single free
-                                # ellipsis.
-                                # Therefore the number of dimensions the ellipsis
-                                # corresponds to, is the number of dimensions
-                                # remaining.
-                                forward_index = 0
-                                for forward_dim in detail.dims:  # now iterate forwards
-                                    if forward_dim is dim:
-                                        break
-                                    assert forward_dim.size is ...
-                                    forward_index += len(
-                                        memo.name_to_shape[forward_dim.name]
-                                    )
-                                if reverse_dim_index == 0:
-                                    # since [:-0] doesn't work
-                                    end_index = None
-                                else:
-                                    end_index = -reverse_dim_index
-                                clip_shape = shape[forward_index:end_index]
-                                memo.name_to_shape[dim.name] = tuple(clip_shape)
-                                for _ in range(len(clip_shape) - 1):
-                                    next(reversed_shape)
-                            else:
-                                reversed_shape_piece = []
-                                if len(lookup_shape) >= 1:
-                                    reversed_shape_piece.append(size)
-                                for _ in range(len(lookup_shape) - 1):
-                                    try:
-                                        _, size = next(reversed_shape)
-                                    except StopIteration:
-                                        break
-                                    reversed_shape_piece.append(size)
-
-                                shape_piece = tuple(reversed(reversed_shape_piece))
-                                if lookup_shape != shape_piece:
-                                    raise TypeError(
-                                        f"Dimension group '{dim.name}' of "
-                                        f"inconsistent shape. Got both {shape_piece} "
-                                        f"and {lookup_shape}."
-                                    )
-                        else:
-                            names_to_check = (
-                                [dim.name, dim.size]
-                                if isinstance(dim.size, str)
-                                else [dim.name]
-                            )
-                            for name in names_to_check:
-                                try:
-                                    lookup_size = memo.name_to_size[name]
-                                except KeyError:
-                                    memo.name_to_size[name] = size
-                                else:
-                                    # Technically not necessary, as one of the
-                                    # sizes will override the other, and then the
-                                    # instance check will fail.
-                                    # This gives a nicer error message though.
-                                    if lookup_size != size:
-                                        raise TypeError(
-                                            f"Dimension '{dim.name}' of inconsistent"
-                                            f" size. Got both {size} and "
-                                            f"{lookup_size}."
-                                        )
-
-                del shape_info[argname, shape, detail]
+    def __init__(
+        self,
+        type_hints: Dict[str, Any],
+        options: Dict[str, Any],
+        check_plain: Callable,
+        check_nested: Callable,
+    ):
+        has_arrays = False
+        cacheable = True
+        identity_cache = options["identity_cache"]
+        array_argnames = []
+        array_arguments = []
+        plain_arguments = []
+
+        def entry(argname, description, expected_type):
+            nonlocal has_arrays, cacheable
+            annotation = _jaxtyping_annotation(expected_type)
+            pytree = _pytree_annotation(expected_type)
+            container = _homogeneous_annotation(expected_type)
+            if annotation is not None:
+                check = _make_array_check(*annotation, identity_cache)
+                has_arrays = True
+                _, metadata = annotation
+                if not _is_signature_only(metadata):
+                    cacheable = False
+            elif container is not None:
+                check = _make_container_check(*container, check_plain, identity_cache)
+                has_arrays = True
+                cacheable = False
+            elif pytree is not None:
+                if identity_cache:
+                    pytree = pytree.with_identity_cache()
+                check = pytree.check
+                has_arrays = True
+                cacheable = False
+            elif _contains_jaxtyping(expected_type):
+                check = check_nested
+                has_arrays = True
+                cacheable = False
+            else:
+                check = check_plain
+            return argname, description, expected_type, check
+
+        arguments = []
+        for argname, expected_type in type_hints.items():
+            if argname != "return":
+                arguments.append(
+                    entry(argname, 'argument "{}"'.format(argname), expected_type)
+                )
+                if arguments[-1][3] is check_plain:
+                    plain_arguments.append(arguments[-1])
+                else:
+                    array_argnames.append(argname)
+                    array_arguments.append(arguments[-1])
+        self.arguments = tuple(arguments)
+        if "return" in type_hints:
+            self.return_entry = entry(
+                "return", "the return value", type_hints["return"]
+            )
+        else:
+            self.return_entry = None
+        self.has_arrays = has_arrays
+        self.version = config._version
+        self.array_argnames = tuple(array_argnames)
+        self.array_arguments = tuple(array_arguments)
+        self.plain_arguments = tuple(plain_arguments)
+        self.signature_cache_size = options["signature_cache_size"]
+        if has_arrays and cacheable and self.signature_cache_size > 0:
+            self.signature_cache = {}
+            self.cache_lock = threading.Lock()
+            self.cache_used = set()
+        else:
+            self.signature_cache = None
+            self.cache_lock = None
+            self.cache_used = None
+        if options["check_every"] > 1 or options["backoff_after"] > 0:
+            self.sampler = _Sampler(options)
+        else:
+            self.sampler = None
+        self.yield_options = (
+            options["yield_dims"] == "stream",
+            frozenset(options["per_yield_dims"]),
+            options["check_yield_every"],
+        )
+        # Deferring needs every check to depend on nothing but the type, shape and dtype
+        # of each array, just like the signature cache.
+        self.deferred = options["deferred"] and has_arrays and cacheable
+
+    def signature(self, arguments: Dict[str, Any]) -> Optional[tuple]:
+        # The key into `signature_cache` for a call with the given arguments, or None
+        # if it can't have one.
+        key = []
+        for argname in self.array_argnames:
+            try:
+                value = arguments[argname]
+            except KeyError:
+                key.append(None)
+            else:
+                try:
+                    key.append((type(value), value.shape, value.dtype))
+                except AttributeError:
+                    return None
+        return tuple(key)
+
+    def cache_lookup(self, key: tuple) -> Any:
+        # Returns the dimension sizes cached for the signature `key`, or None if they
+        # aren't in the cache.
+        cache = self.signature_cache
+        try:
+            sizes = cache[key]
+        except (KeyError, TypeError):  # TypeError: unhashable
+            return None
+        used = self.cache_used
+        if key not in used:
+            used.add(key)
+        return sizes
+
+    def cache_store(self, key: tuple, memo) -> None:
+        cache = self.signature_cache
+        used = self.cache_used
+        sizes = (dict(memo.name_to_size), dict(memo.name_to_shape))
+        with self.cache_lock:
+            if key not in cache and len(cache) >= self.signature_cache_size:
+                # Evict the oldest signature that hasn't been used since it was last
+                # given a second chance. A signature given a second chance is moved
+                # to the back, so at most one pass over the cache is needed. (Unless
+                # concurrent lookups keep marking signatures as used, hence the
+                # bound. A concurrent lookup of a signature being moved may miss,
+                # which just means that call is checked in full.)
+                for _ in range(len(cache)):
+                    oldest = next(iter(cache))
+                    if oldest not in used:
+                        break
+                    used.discard(oldest)
+                    cache[oldest] = cache.pop(oldest)
+                else:
+                    oldest = next(iter(cache))
+                del cache[oldest]
+                if len(used) > len(cache):
+                    # A lookup racing with an eviction can leave an evicted signature
+                    # in `used`.
+                    used.intersection_update(cache)
+            cache[key] = sizes
+
+
+# Once a function has been called with this many different signatures, forget them all
+# and start again.
+_max_sampler_signatures = 1024
+
+
+class _Sampler:
+    # Decides which calls of a single function are checked, when only some of them
+    # should be.
+    #
+    # Every `check_every`-th call is checked. If `backoff_after` is positive, then once
+    # that many checked calls in a row have passed, the interval between checked calls
+    # doubles with every further pass, up to `backoff_max_interval`. Calls with an
+    # argument signature that hasn't been seen before are always checked, and reset the
+    # interval.
+    #
+    # The counters aren't locked: calls from multiple threads at once may occasionally
+    # check a call more or less than they otherwise would, but this is harmless.
+    __slots__ = (
+        "check_every",
+        "backoff_after",
+        "backoff_max_interval",
+        "countdown",
+        "passes",
+        "signatures",
+        "checked",
+        "skipped",
+    )
+
+    def __init__(self, options: Dict[str, Any]):
+        self.check_every = options["check_every"]
+        self.backoff_after = options["backoff_after"]
+        self.backoff_max_interval = options["backoff_max_interval"]
+        # The number of calls to skip before the next check.
+        self.countdown = 0
+        # The number of checked calls in a row that have passed.
+        self.passes = 0
+        self.signatures = {}
+        self.checked = 0
+        self.skipped = 0
+
+    def should_check(self, signature: Optional[tuple]) -> bool:
+        if signature is not None:
+            try:
+                new = signature not in self.signatures
+            except TypeError:  # unhashable
+                new = False
+            if new:
+                if len(self.signatures) >= _max_sampler_signatures:
+                    self.signatures.clear()
+                self.signatures[signature] = None
+                self.countdown = 0
+                self.passes = 0
+        if self.countdown > 0:
+            self.countdown -= 1
+            self.skipped += 1
+            return False
+        self.checked += 1
+        return True
+
+    def passed(self) -> None:
+        self.passes += 1
+        interval = self.check_every
+        if self.backoff_after > 0 and self.passes >= self.backoff_after:
+            doublings = min(self.passes - self.backoff_after + 1, 32)
+            interval = max(
+                interval, min(interval << doublings, self.backoff_max_interval)
+            )
+        self.countdown = interval - 1
+
+    def failed(self) -> None:
+        self.passes = 0
+        self.countdown = 0
+
+
+def _unwrap_to_plan(func: Callable) -> Optional[_CheckPlan]:
+    # Follows the chain of `__wrapped__` from a decorated function to the function that
+    # actually has a check plan.
+    while True:
+        try:
+            return _plans[func]
+        except (KeyError, TypeError):
+            pass
+        try:
+            func = func.__wrapped__
+        except AttributeError:
+            return None
+
+
+def check_counts(func: Callable) -> Dict[str, int]:
+    """Returns the number of calls to `func` that have been checked and skipped, when
+    it is only checking some of its calls (see the `check_every` and `backoff_after`
+    options). `func` may be either the original function or its typechecked wrapper.
+
+    The counts start again from zero whenever the options are changed.
+    """
+    plan = _unwrap_to_plan(func)
+    if plan is None or plan.sampler is None:
+        raise ValueError(f"{func} is not sampling its checks.")
+    return {"checked": plan.sampler.checked, "skipped": plan.sampler.skipped}
+
+
+def _check_arguments(entries: Tuple[tuple, ...], arguments: Dict[str, Any], memo):
+    for argname, description, expected_type, check in entries:
+        if argname in arguments:
+            try:
+                check(description, arguments[argname], expected_type, memo)
+            except TypeError as exc:  # suppress long traceback
+                raise TypeError(*exc.args) from None
+
+
+def _check_call_arguments(plan: _CheckPlan, memo, key: Optional[tuple]) -> None:
+    # `key` is the signature of the call, if the plan has a signature cache.
+    if plan.deferred:
+        _defer_call_arguments(plan, memo)
+        return
+    arguments = memo.arguments
+    if key is not None:
+        sizes = plan.cache_lookup(key)
+        if instrumentation._enabled:
+            instrumentation._record_cache(memo.func, sizes is not None)
+        if sizes is not None:
+            # These exact array types, shapes and dtypes have passed before, so only
+            # the other arguments need checking.
+            memo.value_info = []
+            name_to_size, name_to_shape = sizes
+            memo.name_to_size = dict(name_to_size)
+            memo.name_to_shape = dict(name_to_shape)
+            _check_arguments(plan.plain_arguments, arguments, memo)
+            return
+    if plan.has_arrays:
+        memo.value_info = []
+        memo.name_to_size = {}
+        memo.name_to_shape = {}
+    _check_arguments(plan.arguments, arguments, memo)
+    if plan.has_arrays:
+        try:
+            _timed_check_memo(memo)
+        except TypeError as exc:  # suppress long traceback
+            raise TypeError(*exc.args) from None
+    if key is not None:
+        plan.cache_store(key, memo)
+
+
+# DEFERRED CHECKING
+#######################
+# With the `deferred` option, a call only records the type, shape and dtype of each
+# JaxArray argument and return value (a "snapshot"), and hands them to a single
+# background thread to be checked. (Other arguments are still checked straight away.)
+# The background thread checks a snapshot by standing in a ShapedArray for each array,
+# so that the usual machinery, and error messages, can be reused.
+
+
+class _Memo:
+    # Stands in for typeguard's _CallMemo, for checking outside of a function call.
+    __slots__ = ("value_info", "name_to_size", "name_to_shape")
+
+    def __init__(self, name_to_size=None, name_to_shape=None):
+        self.value_info = []
+        self.name_to_size = {} if name_to_size is None else name_to_size
+        self.name_to_shape = {} if name_to_shape is None else name_to_shape
+
+
+def _snapshot(value: Any) -> tuple:
+    try:
+        return type(value), value.shape, value.dtype
+    except AttributeError:
+        return type(value), None, None
+
+
+def _check_snapshot(description: str, snapshot: tuple, expected_type: Any, memo):
+    base_cls, metadata = _jaxtyping_annotation(expected_type)
+    cls, shape, dtype = snapshot
+    if shape is None or not issubclass(cls, base_cls):
+        expected_string = _to_string(
+            metadata["cls_name"], [repr(detail) for detail in metadata["details"]]
+        )
+        raise TypeError(
+            f"{description} must be of type {expected_string}, got type "
+            f"{cls.__qualname__} instead."
+        )
+    backend = backends._backend_of(base_cls)
+    value = backend.shaped_array(shape, dtype)
+    _check_array(description, value, backend.abstract_type, metadata, memo)
+
+
+class _DeferredCall:
+    __slots__ = ("plan", "arguments", "sizes")
+
+    def __init__(self, plan: _CheckPlan, arguments: tuple):
+        self.plan = plan
+        # (description, expected_type, snapshot) for each array argument.
+        self.arguments = arguments
+        # The dimension sizes bound by the arguments, once they've been checked.
+        self.sizes = None
+
+    def check_arguments(self) -> None:
+        memo = _Memo()
+        for description, expected_type, snapshot in self.arguments:
+            _check_snapshot(description, snapshot, expected_type, memo)
+        _check_memo(memo)
+        self.sizes = (memo.name_to_size, memo.name_to_shape)
+
+    def check_return(self, snapshot: tuple) -> None:
+        # Checked after the arguments, as there's only one background thread.
+        if self.sizes is None:  # the arguments failed
+            return
+        name_to_size, name_to_shape = self.sizes
+        memo = _Memo(dict(name_to_size), dict(name_to_shape))
+        _, description, expected_type, _ = self.plan.return_entry
+        _check_snapshot(description, snapshot, expected_type, memo)
+        _check_memo(memo)
+
+
+# Calls block once this many checks are waiting, so that memory stays bounded if checks
+# can't keep up.
+_max_deferred_checks = 1 << 16
+_deferred_queue = queue.Queue(maxsize=_max_deferred_checks)
+# The first failure of each function, in the order they happened.
+_deferred_errors: Dict[Callable, TypeError] = {}
+_deferred_lock = threading.Lock()
+_deferred_worker = None
+
+
+def _defer(func: Callable, check: Callable[[], None]) -> None:
+    global _deferred_worker
+    if _deferred_worker is None:
+        with _deferred_lock:
+            if _deferred_worker is None:
+                _deferred_worker = threading.Thread(
+                    target=_run_deferred, name="jaxtyping-deferred", daemon=True
+                )
+                _deferred_worker.start()
+    _deferred_queue.put((func, check))
+
+
+def _run_deferred() -> None:
+    while True:
+        func, check = _deferred_queue.get()
+        try:
+            check()
+        except Exception as e:
+            with _deferred_lock:
+                _deferred_errors.setdefault(func, e)
+        finally:
+            _deferred_queue.task_done()
+
+
+def _deferred_error(func: Callable, error: Exception) -> TypeError:
+    name = getattr(func, "__qualname__", repr(func))
+    return TypeError(f"A deferred check of an earlier call to {name} failed: {error}")
+
+
+def _raise_deferred(func: Callable) -> None:
+    if func in _deferred_errors:
+        with _deferred_lock:
+            error = _deferred_errors.pop(func, None)
+        if error is not None:
+            raise _deferred_error(func, error)
+
+
+def _defer_call_arguments(plan: _CheckPlan, memo) -> None:
+    arguments = memo.arguments
+    _check_arguments(plan.plain_arguments, arguments, memo)
+    snapshots = []
+    for argname, description, expected_type, _ in plan.array_arguments:
+        if argname in arguments:
+            snapshots.append(
+                (description, expected_type, _snapshot(arguments[argname]))
+            )
+    call = _DeferredCall(plan, tuple(snapshots))
+    memo.deferred = call
+    _defer(memo.func, call.check_arguments)
+
+
+def sync_checks() -> None:
+    """Waits for every check deferred so far (see the `deferred` option) to finish.
+    Then raises a `TypeError` for the earliest failure, if any of them failed. (Any
+    other failures are forgotten.)
+    """
+    _deferred_queue.join()
+    with _deferred_lock:
+        errors = list(_deferred_errors.items())
+        _deferred_errors.clear()
+    if len(errors) > 0:
+        func, error = errors[0]
+        raise _deferred_error(func, error)
+
+
+def _timed_check_memo(memo) -> None:
+    if instrumentation._enabled:
+        start = time.perf_counter()
+        try:
+            _check_memo(memo)
+        finally:
+            instrumentation._record_memo(memo.func, time.perf_counter() - start)
+    else:
+        _check_memo(memo)
+
+
+class _ItemChecker:
+    # Checks the items yielded by (or sent to) a single generator, against the dimension
+    # sizes bound by the arguments of the call that created the generator.
+    #
+    # With the "independent" `yield_dims` option, every item starts from the sizes bound
+    # by the arguments. With "stream", the sizes bound by each checked item are kept
+    # for the items after it, apart from those of `per_yield_dims`. Either way, only
+    # every `check_yield_every`-th step of the generator is checked.
+    __slots__ = (
+        "memo",
+        "check_type",
+        "name_to_size",
+        "name_to_shape",
+        "arg_name_to_size",
+        "arg_name_to_shape",
+        "stream",
+        "per_yield_dims",
+        "check_every",
+        "countdown",
+    )
+
+    def __init__(self, memo, plan: "_CheckPlan", check_type: Callable):
+        self.memo = memo
+        self.check_type = check_type
+        self.arg_name_to_size = self.name_to_size = dict(memo.name_to_size)
+        self.arg_name_to_shape = self.name_to_shape = dict(memo.name_to_shape)
+        self.stream, self.per_yield_dims, self.check_every = plan.yield_options
+        self.countdown = 0
+
+    def step(self) -> bool:
+        # Called once per step of the generator. Returns whether to check this step.
+        if self.countdown > 0:
+            self.countdown -= 1
+            return False
+        self.countdown = self.check_every - 1
+        return True
+
+    def check(self, argname: str, value: Any, expected_type: Any) -> None:
+        memo = self.memo
+        memo.value_info = []
+        # Copied, as checking adds to them (and may fail partway through).
+        memo.name_to_size = dict(self.name_to_size)
+        memo.name_to_shape = dict(self.name_to_shape)
+        try:
+            self.check_type(argname, value, expected_type, memo)
+            _timed_check_memo(memo)
+        except TypeError as exc:  # suppress long traceback
+            raise TypeError(*exc.args) from None
+        if self.stream:
+            name_to_size = memo.name_to_size
+            name_to_shape = memo.name_to_shape
+            for name in self.per_yield_dims:
+                # Back to whatever the arguments bound it to, if anything.
+                _restore(name_to_size, self.arg_name_to_size, name)
+                _restore(name_to_shape, self.arg_name_to_shape, name)
+            self.name_to_size = name_to_size
+            self.name_to_shape = name_to_shape
+
+
+def _restore(sizes: Dict[str, Any], original: Dict[str, Any], name: str) -> None:
+    try:
+        sizes[name] = original[name]
+    except KeyError:
+        sizes.pop(name, None)
+
+
+def _unresolved_error(names: set, groups: set) -> TypeError:
+    return TypeError(
+        f"Could not resolve the size of all `...` in {names} (specifically the `...` "
+        f"named {groups}). Either:\n"
+        "(1) the specification is ambiguous. For example "
+        "`func(arr: JaxArray['x': ..., 'y': ...])`.\n"
+        "(2) or repeated named `...` are used without being able to "
+        "resolve the size of those named `...` via another argument "
+        "For example `func(arr: JaxArray['x': ..., 'x': ...])`. "
+        "(But `func(arr1: JaxArray['x': ..., 'x': ...], arr2: "
+        "JaxArray['x': ...])` would be fine.)\n"
+        "\n"
+        "Removing the names of the `...` should suffice to resolve this "
+        "error. (But will of course remove that checking as well.)"
+    )
+
+
+def _shape_error(argname: str, shape: tuple, cls_name: str, detail: ShapeDetail, memo):
+    # Raises an error describing how an array of shape `shape` fails to match `detail`,
+    # once the sizes inferred so far have been filled in.
+    dims = []
+    for dim in detail.dims:
+        size = dim.size
+        if dim.name not in (None, _no_name):
+            if size == -1:
+                size = memo.name_to_size.get(dim.name, -1)
+            elif isinstance(size, str):
+                size = memo.name_to_size.get(size, size)
+            elif size is ... and dim.name in memo.name_to_shape:
+                for size in memo.name_to_shape[dim.name]:
+                    dims.append(_Dim(name=_no_name, size=size))
+                continue
+        dims.append(_Dim(name=dim.name, size=size))
+    detail = detail.update(dims=tuple(dims))
+    if not detail._check_shape(shape):
+        expected_string = _to_string(cls_name, [repr(detail)])
+        given_string = _to_string(cls_name, [_dims_repr(tuple(shape))])
+        raise TypeError(
+            f"{argname} must be of type {expected_string}, got type {given_string} "
+            "instead."
+        )
+    # Shouldn't be reachable, but just in case.
+    raise TypeError(f"{argname} does not match {cls_name}[{detail!r}].")
+
+
+def _bind_sizes(argname: str, shape: tuple, cls_name: str, detail: ShapeDetail, memo):
+    # Binds the sizes of the named dimensions of a single array, checking them against
+    # any sizes already bound. Every `...` of the array must either be unnamed or have a
+    # size that is already known, except for at most one, which is inferred here.
+    name_to_size = memo.name_to_size
+    for index, dim_name, names in detail._named_trailing:
+        size = shape[index]
+        for name in names:
+            try:
+                lookup_size = name_to_size[name]
+            except KeyError:
+                name_to_size[name] = size
+            else:
+                if lookup_size != size:
+                    raise TypeError(
+                        f"Dimension '{dim_name}' of inconsistent size. Got both "
+                        f"{size} and {lookup_size}."
+                    )
+
+    groups = detail._groups
+    if len(groups) == 0:
+        return
+    name_to_shape = memo.name_to_shape
+    end = len(shape) - detail._num_trailing
+    unnamed = _no_name in groups
+    if unnamed:
+        # Only the groups to the right of the rightmost unnamed `...` have a known
+        # position.
+        for position in range(len(groups) - 1, -1, -1):
+            if groups[position] is _no_name:
                 break
+        positioned = groups[position + 1 :]
+        total = sum(
+            len(name_to_shape[group]) for group in groups if group is not _no_name
+        )
+        if total > end:
+            _shape_error(argname, shape, cls_name, detail, memo)
+    else:
+        positioned = groups
+    # Now walk the groups from right to left, checking the shape of each against the
+    # corresponding piece of the array's shape.
+    for position in range(len(positioned) - 1, -1, -1):
+        group = positioned[position]
+        try:
+            lookup_shape = name_to_shape[group]
+        except KeyError:
+            # The single group of unknown size: it's everything not taken up by the
+            # groups to its left.
+            start = sum(len(name_to_shape[left]) for left in positioned[:position])
+            start = min(start, end)
+            name_to_shape[group] = tuple(shape[start:end])
+            end = start
         else:
-            if len(shape_info):
-                names = {argname for argname, _, _ in shape_info}
+            start = end - len(lookup_shape)
+            shape_piece = tuple(shape[max(start, 0) : end])
+            if lookup_shape != shape_piece:
                 raise TypeError(
-                    f"Could not resolve the size of all `...` in {names}. Either:\n"
-                    "(1) the specification is ambiguous. For example "
-                    "`func(arr: JaxArray['x': ..., 'y': ...])`.\n"
-                    "(2) or repeated named `...` are used without being able to "
-                    "resolve the size of those named `...` via another argument "
-                    "For example `func(arr: JaxArray['x': ..., 'x': ...])`. "
-                    "(But `func(arr1: JaxArray['x': ..., 'x': ...], arr2: "
-                    "JaxArray['x': ...])` would be fine.)\n"
-                    "\n"
-                    "Removing the names of the `...` should suffice to resolve this "
-                    "error. (But will of course remove that checking as well.)"
+                    f"Dimension group '{group}' of inconsistent shape. Got both "
+                    f"{shape_piece} and {lookup_shape}."
                 )
+            end = start
+    if end != 0 and not unnamed:
+        # Dimensions left over at the start of the shape.
+        _shape_error(argname, shape, cls_name, detail, memo)
+
 
+def _check_memo(memo):
     ###########
-    # Do the final checking with the inferred sizes filled in.
-    # In practice, malformed inputs will usually trip one of the
-    # checks in the previous logic, so this block doesn't actually raise
-    # errors very often. (In 1/37 tests at time of writing.)
-    # A potential performance improvement might be to integrate it into
-    # the previous block.
+    # Parse the tensors, figure out the sizes of all labelled dimensions, and check
+    # that they are consistent.
+    #
+    # Most of the complexity comes from supporting named `...`. An array can only be
+    # checked once at most one of its `...` is of unknown size (unnamed `...` always
+    # count as unknown), as then that one is whatever is left over. So this is solved
+    # as a worklist: the arrays that can be checked straight away are checked first,
+    # and each group of dimensions inferred from them may in turn unlock more arrays.
+    # Every array is checked exactly once.
     ###########
 
-    for argname, value, cls_name, detail in memo.value_info:
-        dims = []
-        for dim in detail.dims:
-            size = dim.size
-            if dim.name not in (None, _no_name):
-                if size == -1:
-                    size = memo.name_to_size[dim.name]
-                elif isinstance(size, str):
-                    size = memo.name_to_size[size]
-                elif size is ...:
-                    # This assumes that named Ellipses only occur to the
-                    # right of unnamed Ellipses, to avoid filling in
-                    # Ellipses that occur to the left of other Ellipses.
-                    for size in memo.name_to_shape[dim.name]:
-                        dims.append(_Dim(name=_no_name, size=size))
-                    continue
-            dims.append(_Dim(name=dim.name, size=size))
-        detail = detail.update(dims=tuple(dims))
-        _check_tensor(
-            argname, value, (jnp.ndarray, jax.core.UnshapedArray), {"cls_name": cls_name, "details": [detail]}
-        )
+    # ordered set
+    shape_info = dict.fromkeys(memo.value_info)
+    name_to_shape = memo.name_to_shape
+    ready = []
+    # For each array that cannot be checked yet: the number of `...` of unknown size.
+    num_unknown = {}
+    # For each group of unknown size: the arrays waiting on it.
+    waiting = {}
+    for key in shape_info:
+        groups = key[3]._groups
+        if len(groups) == 0:
+            ready.append(key)
+            continue
+        unknown = 0
+        for group in groups:
+            if group is _no_name or group not in name_to_shape:
+                unknown += 1
+        if unknown <= 1:
+            ready.append(key)
+        else:
+            num_unknown[key] = unknown
+            for group in groups:
+                if group is not _no_name and group not in name_to_shape:
+                    waiting.setdefault(group, []).append(key)
+
+    index = 0
+    while index < len(ready):
+        key = ready[index]
+        index += 1
+        argname, shape, cls_name, detail = key
+        groups = detail._groups
+        if len(waiting) == 0 or len(groups) == 0:
+            _bind_sizes(argname, shape, cls_name, detail, memo)
+            continue
+        unknown_groups = [
+            group
+            for group in groups
+            if group is not _no_name and group not in name_to_shape
+        ]
+        _bind_sizes(argname, shape, cls_name, detail, memo)
+        for group in unknown_groups:
+            for waiting_key in waiting.pop(group, ()):
+                num_unknown[waiting_key] -= 1
+                if num_unknown[waiting_key] == 1:
+                    ready.append(waiting_key)
+
+    if len(ready) < len(shape_info):
+        names = {key[0] for key in num_unknown if num_unknown[key] > 1}
+        raise _unresolved_error(names, set(waiting))
 
 
 unpatched_typeguard = True
+_patch_lock = threading.Lock()
+# Check plans are cached per function, in the same way that typeguard caches type hints
+# per function. Read without locking; written with `_plans_lock`.
+_plans = weakref.WeakKeyDictionary()
+_plans_lock = threading.Lock()
+# Set when typeguard is patched: typeguard's own `check_type` and `check_return_type`,
+# and our patched `check_type`.
+_typeguard_check_type = None
+_typeguard_check_return_type = None
+_patched_check_type = None
+
+
+def _get_plan(memo) -> _CheckPlan:
+    try:
+        plan = _plans[memo.func]
+    except KeyError:
+        pass
+    else:
+        if plan.version == config._version:
+            return plan
+    # Two threads might both build a plan for the same function at once, which is
+    # harmless: they're equivalent.
+    plan = _CheckPlan(
+        memo.type_hints,
+        config._resolve(memo.func),
+        _typeguard_check_type,
+        _patched_check_type,
+    )
+    with _plans_lock:
+        _plans[memo.func] = plan
+    return plan
+
+
+def _check_plan_arguments(plan: _CheckPlan, memo) -> None:
+    if plan.deferred and _deferred_errors:
+        _raise_deferred(memo.func)
+    if not instrumentation._enabled:
+        _check_sampled_arguments(plan, memo)
+        return
+    spans = instrumentation._enter_spans(memo.func, "arguments")
+    start = time.perf_counter()
+    try:
+        checked = _check_sampled_arguments(plan, memo)
+    except TypeError:
+        duration = time.perf_counter() - start
+        instrumentation._exit_spans(spans)
+        instrumentation._record(memo.func, "arguments", start, duration, True)
+        raise
+    duration = time.perf_counter() - start
+    instrumentation._exit_spans(spans)
+    if checked:
+        instrumentation._record(memo.func, "arguments", start, duration, False)
+    else:
+        instrumentation._record_skip(memo.func)
+
+
+def _check_sampled_arguments(plan: _CheckPlan, memo) -> bool:
+    # Returns whether the arguments were checked, or skipped due to sampling.
+    sampler = plan.sampler
+    if sampler is None:
+        if plan.signature_cache is None:
+            key = None
+        else:
+            key = plan.signature(memo.arguments)
+        _check_call_arguments(plan, memo, key)
+        return True
+    key = plan.signature(memo.arguments)
+    memo.sampled = sampler.should_check(key)
+    if memo.sampled:
+        if plan.signature_cache is None:
+            key = None
+        try:
+            _check_call_arguments(plan, memo, key)
+        except TypeError:
+            sampler.failed()
+            raise
+        sampler.passed()
+    return memo.sampled
+
+
+def _check_plan_return(plan: _CheckPlan, retval: Any, memo) -> Any:
+    if (
+        not instrumentation._enabled
+        or plan.return_entry is None
+        or not getattr(memo, "sampled", True)
+    ):
+        return _check_sampled_return(plan, retval, memo)
+    spans = instrumentation._enter_spans(memo.func, "return")
+    start = time.perf_counter()
+    try:
+        retval = _check_sampled_return(plan, retval, memo)
+    except TypeError:
+        duration = time.perf_counter() - start
+        instrumentation._exit_spans(spans)
+        instrumentation._record(memo.func, "return", start, duration, True)
+        raise
+    duration = time.perf_counter() - start
+    instrumentation._exit_spans(spans)
+    instrumentation._record(memo.func, "return", start, duration, False)
+    return retval
+
+
+def _check_sampled_return(plan: _CheckPlan, retval: Any, memo) -> Any:
+    sampler = plan.sampler
+    if sampler is None:
+        return _check_call_return(plan, retval, memo)
+    if not getattr(memo, "sampled", True):
+        return True
+    try:
+        return _check_call_return(plan, retval, memo)
+    except TypeError:
+        sampler.failed()
+        raise
+
+
+def _check_call_return(plan: _CheckPlan, retval: Any, memo) -> Any:
+    entry = plan.return_entry
+    if entry is None or entry[3] is _typeguard_check_type:
+        return _typeguard_check_return_type(retval, memo)
+    if plan.deferred:
+        call = getattr(memo, "deferred", None)
+        if call is not None:
+            _defer(memo.func, functools.partial(call.check_return, _snapshot(retval)))
+        return True
+    # Reset the collection of things that need checking.
+    memo.value_info = []
+    # Do _not_ set memo.name_to_size or memo.name_to_shape, as we want to keep using
+    # the same sizes inferred from the arguments.
+    if entry[3] is _patched_check_type:
+        retval = _typeguard_check_return_type(retval, memo)
+    else:
+        _, description, expected_type, check = entry
+        try:
+            check(description, retval, expected_type, memo)
+        except TypeError as exc:  # suppress long traceback
+            raise TypeError(*exc.args) from None
+        retval = True
+    try:
+        _timed_check_memo(memo)
+    except TypeError as exc:  # suppress long traceback
+        raise TypeError(*exc.args) from None
+    return retval
+
+
+def _no_typechecking(func=None, **kwargs):
+    # Replaces typeguard.typechecked when jaxtyping is disabled. Supports both
+    # `@typechecked` and `@typechecked(...)`.
+    if func is None:
+        return _no_typechecking
+    return func
 
 
 def patch_typeguard():
-    global unpatched_typeguard
+    # Cheap check first, so that calling this repeatedly is fast.
     if unpatched_typeguard:
-        unpatched_typeguard = False
+        with _patch_lock:
+            _patch_typeguard()
 
+
+def _patch_typeguard():
+    global unpatched_typeguard
+    global _typeguard_check_type, _typeguard_check_return_type, _patched_check_type
+    # `unpatched_typeguard` is only cleared once patching has finished, as
+    # `patch_typeguard` doesn't take the lock once it's clear.
+    if unpatched_typeguard and config._disabled:
+        typeguard.typechecked = _no_typechecking
+        unpatched_typeguard = False
+    elif unpatched_typeguard:
         # Defined dynamically, in case something else is doing similar levels of hackery
         # patching typeguard. We want to get typeguard._CallMemo at the time we patch,
         # not any earlier. (Someone might have replaced it since the import statement.)
@@ -299,10 +1317,14 @@ def patch_typeguard():
                 "value_info",
                 "name_to_size",
                 "name_to_shape",
+                "sampled",
+                "deferred",
             )
-            value_info: List[Tuple[str, jnp.ndarray, str, Dict[str, Any]]]
+            value_info: List[Tuple[str, Tuple[int, ...], str, ShapeDetail]]
             name_to_size: Dict[str, int]
             name_to_shape: Dict[str, Tuple[int]]
+            sampled: bool
+            deferred: _DeferredCall
 
         _check_type = typeguard.check_type
         _check_argument_types = typeguard.check_argument_types
@@ -312,83 +1334,437 @@ def patch_typeguard():
         check_argument_types_signature = inspect.signature(_check_argument_types)
         check_return_type_signature = inspect.signature(_check_return_type)
 
-        def check_type(*args, **kwargs):
-            bound_args = check_type_signature.bind(*args, **kwargs).arguments
-            argname = bound_args["argname"]
-            value = bound_args["value"]
-            expected_type = bound_args["expected_type"]
-            memo = bound_args["memo"]
-            # First look for an annotated type
-            is_torchtyping_annotation = (
-                memo is not None
-                and hasattr(memo, "value_info")
-                and isinstance(expected_type, _AnnotatedType)
-            )
-            # Now check if it's annotating a tensor
-            if is_torchtyping_annotation:
-                base_cls, *all_metadata = get_args(expected_type)
-                if not issubclass(base_cls, jnp.ndarray):
-                    is_torchtyping_annotation = False
-            # Now check if the annotation's metadata is our metadata
-            if is_torchtyping_annotation:
-                for metadata in all_metadata:
-                    if isinstance(metadata, dict) and "__torchtyping__" in metadata:
-                        break
-                else:
-                    is_torchtyping_annotation = False
-            if is_torchtyping_annotation:
-                # We call _check_tensor here -- despite calling _check_tensor again
-                # once we've seen every argument and filled in the shape details --
-                # just because we want to check that `value` is in fact a tensor before
-                # we access its `shape` field on the next line.
-                _check_tensor(argname, value, base_cls, metadata)
-                for detail in metadata["details"]:
-                    if isinstance(detail, ShapeDetail):
-                        memo.value_info.append(
-                            (argname, value, metadata["cls_name"], detail)
-                        )
-                        break
+        # The checks for List[JaxArray[...]] etc. found nested inside other annotations,
+        # keyed by annotation. None if the annotation doesn't have one. Read without
+        # locking; written with `_plans_lock`.
+        container_checks = {}
+
+        def container_check(expected_type: Any) -> Optional[Callable]:
+            try:
+                return container_checks[expected_type]
+            except KeyError:
+                pass
+            except TypeError:  # unhashable
+                return None
+            container = _homogeneous_annotation(expected_type)
+            if container is None:
+                check = None
+            else:
+                check = _make_container_check(*container, _check_type)
+            with _plans_lock:
+                return container_checks.setdefault(expected_type, check)
 
+        def check_type(*args, **kwargs):
+            if len(args) == 4 and not kwargs:
+                # typeguard always calls this positionally, so skip binding.
+                argname, value, expected_type, memo = args
+            else:
+                bound_args = check_type_signature.bind(*args, **kwargs).arguments
+                argname = bound_args["argname"]
+                value = bound_args["value"]
+                expected_type = bound_args["expected_type"]
+                memo = bound_args["memo"]
+            annotation = pytree = container = None
+            if memo is not None and hasattr(memo, "value_info"):
+                annotation = _jaxtyping_annotation(expected_type)
+                if annotation is None:
+                    pytree = _pytree_annotation(expected_type)
+                    origin = getattr(expected_type, "__origin__", None)
+                    if origin in _homogeneous_origins:
+                        container = container_check(expected_type)
+            if annotation is not None:
+                base_cls, metadata = annotation
+                _check_array(argname, value, base_cls, metadata, memo)
+            elif pytree is not None:
+                pytree.check(argname, value, expected_type, memo)
+            elif container is not None:
+                container(argname, value, expected_type, memo)
             else:
                 _check_type(*args, **kwargs)
 
+        _typeguard_check_type = _check_type
+        _typeguard_check_return_type = _check_return_type
+        _patched_check_type = check_type
+
         def check_argument_types(*args, **kwargs):
-            bound_args = check_argument_types_signature.bind(*args, **kwargs).arguments
-            memo = bound_args["memo"]
+            if len(args) == 1 and not kwargs:
+                (memo,) = args
+            else:
+                bound_args = check_argument_types_signature.bind(
+                    *args, **kwargs
+                ).arguments
+                memo = bound_args["memo"]
             if memo is None:
                 return _check_argument_types(*args, **kwargs)
-            else:
-                memo.value_info = []
-                memo.name_to_size = {}
-                memo.name_to_shape = {}
-                retval = _check_argument_types(*args, **kwargs)
-                try:
-                    _check_memo(memo)
-                except TypeError as exc:  # suppress long traceback
-                    raise TypeError(*exc.args) from None
-                return retval
+            _check_plan_arguments(_get_plan(memo), memo)
+            return True
 
         def check_return_type(*args, **kwargs):
-            bound_args = check_return_type_signature.bind(*args, **kwargs).arguments
-            memo = bound_args["memo"]
+            if len(args) == 2 and not kwargs:
+                retval, memo = args
+            else:
+                bound_args = check_return_type_signature.bind(*args, **kwargs).arguments
+                retval = bound_args["retval"]
+                memo = bound_args["memo"]
             if memo is None:
                 return _check_return_type(*args, **kwargs)
-            else:
-                # Reset the collection of things that need checking.
-                memo.value_info = []
-                # Do _not_ set memo.name_to_size or memo.name_to_shape, as we want to
-                # keep using the same sizes inferred from the arguments.
-                retval = _check_return_type(*args, **kwargs)
+            return _check_plan_return(_get_plan(memo), retval, memo)
+
+        def make_item_checker(memo, *types) -> Optional[_ItemChecker]:
+            if (
+                getattr(memo, "sampled", True)
+                and hasattr(memo, "name_to_size")
+                and any(_contains_jaxtyping(type_) for type_ in types)
+            ):
+                return _ItemChecker(memo, _get_plan(memo), check_type)
+            # No JaxArrays to check, or this call isn't being checked at all.
+            return None
+
+        class _TypeCheckedGenerator(typeguard.TypeCheckedGenerator):
+            def __init__(self, wrapped, memo):
+                super().__init__(wrapped, memo)
+                rtype_args = getattr(memo.type_hints["return"], "__args__", ())
+                self._jaxtyping_wrapped = wrapped
+                self._jaxtyping_yield_type = rtype_args[0] if rtype_args else Any
+                self._jaxtyping_send_type = (
+                    rtype_args[1] if len(rtype_args) > 1 else Any
+                )
+                self._jaxtyping_return_type = (
+                    rtype_args[2] if len(rtype_args) > 2 else Any
+                )
+                self._jaxtyping_initialized = False
+                self._jaxtyping_checker = make_item_checker(
+                    memo,
+                    self._jaxtyping_yield_type,
+                    self._jaxtyping_send_type,
+                    self._jaxtyping_return_type,
+                )
+
+            def send(self, obj):
+                checker = self._jaxtyping_checker
+                if checker is None:
+                    return super().send(obj)
+                checked = checker.step()
+                if not self._jaxtyping_initialized:
+                    self._jaxtyping_initialized = True
+                elif checked:
+                    checker.check(
+                        "value sent to generator", obj, self._jaxtyping_send_type
+                    )
                 try:
-                    _check_memo(memo)
-                except TypeError as exc:  # suppress long traceback
-                    raise TypeError(*exc.args) from None
-                return retval
+                    value = self._jaxtyping_wrapped.send(obj)
+                except StopIteration as exc:
+                    checker.check(
+                        "return value", exc.value, self._jaxtyping_return_type
+                    )
+                    raise
+                if checked:
+                    checker.check(
+                        "value yielded from generator",
+                        value,
+                        self._jaxtyping_yield_type,
+                    )
+                return value
+
+        class _TypeCheckedAsyncGenerator(typeguard.TypeCheckedAsyncGenerator):
+            def __init__(self, wrapped, memo):
+                super().__init__(wrapped, memo)
+                rtype_args = memo.type_hints["return"].__args__
+                self._jaxtyping_wrapped = wrapped
+                self._jaxtyping_yield_type = rtype_args[0]
+                self._jaxtyping_send_type = (
+                    rtype_args[1] if len(rtype_args) > 1 else Any
+                )
+                self._jaxtyping_initialized = False
+                self._jaxtyping_checker = make_item_checker(
+                    memo, self._jaxtyping_yield_type, self._jaxtyping_send_type
+                )
+
+            async def asend(self, obj):
+                checker = self._jaxtyping_checker
+                if checker is None:
+                    return await super().asend(obj)
+                checked = checker.step()
+                if not self._jaxtyping_initialized:
+                    self._jaxtyping_initialized = True
+                elif checked:
+                    checker.check(
+                        "value sent to generator", obj, self._jaxtyping_send_type
+                    )
+                value = await self._jaxtyping_wrapped.asend(obj)
+                if checked:
+                    checker.check(
+                        "value yielded from generator",
+                        value,
+                        self._jaxtyping_yield_type,
+                    )
+                return value
 
         typeguard._CallMemo = _CallMemo
+        typeguard.TypeCheckedGenerator = _TypeCheckedGenerator
+        typeguard.TypeCheckedAsyncGenerator = _TypeCheckedAsyncGenerator
         typeguard.check_type = check_type
         typeguard.check_argument_types = check_argument_types
         typeguard.check_return_type = check_return_type
         typeguard.get_type_hints = lambda *args, **kwargs: get_type_hints(
             *args, **kwargs, include_extras=True
         )
+        unpatched_typeguard = False
+
+
+# NATIVE DECORATOR
+#######################
+# `checked` does the same checking as the patched `typeguard.typechecked`, but without
+# typeguard's per-call `_CallMemo`, which looks up the function's signature and binds
+# the arguments with `inspect` on every call. Instead the signature is analysed once,
+# on the first call, and arguments are bound positionally where possible. The checking
+# itself goes through the same check plans as the patched typeguard, so all of the
+# options apply, and annotations without any JaxArray[...] are still checked by
+# typeguard's own `check_type`.
+
+
+class _CheckedMemo(typeguard._TypeCheckMemo):
+    # Stands in for typeguard's _CallMemo.
+    __slots__ = (
+        "func",
+        "func_name",
+        "type_hints",
+        "arguments",
+        "value_info",
+        "name_to_size",
+        "name_to_shape",
+        "sampled",
+        "deferred",
+    )
+
+    def __init__(self, signature: "_CheckedSignature", arguments: Dict[str, Any]):
+        super().__init__(signature.globals, signature.locals)
+        self.func = signature.func
+        self.func_name = signature.func_name
+        self.type_hints = signature.type_hints
+        self.arguments = arguments
+        self.value_info = []
+
+
+def _parameters(func: Callable) -> List[Tuple[str, Any, Any]]:
+    # The `(name, kind, default)` of each parameter of `func`, in the order of
+    # `inspect.signature(func).parameters`. This runs for every function decorated with
+    # `checked` on its first call, so plain Python functions are read straight off
+    # their code object, which is several times faster than `inspect.signature`.
+    Parameter = inspect.Parameter
+    if type(func) is not types.FunctionType or hasattr(func, "__signature__"):
+        return [
+            (name, parameter.kind, parameter.default)
+            for name, parameter in inspect.signature(func).parameters.items()
+        ]
+    code = func.__code__
+    num_positional = code.co_argcount
+    num_positional_only = getattr(code, "co_posonlyargcount", 0)  # Python 3.8+
+    num_keyword_only = code.co_kwonlyargcount
+    names = code.co_varnames
+    defaults = func.__defaults__ or ()
+    keyword_defaults = func.__kwdefaults__ or {}
+    first_default = num_positional - len(defaults)
+    parameters = []
+    for index in range(num_positional):
+        if index < num_positional_only:
+            kind = Parameter.POSITIONAL_ONLY
+        else:
+            kind = Parameter.POSITIONAL_OR_KEYWORD
+        if index < first_default:
+            default = Parameter.empty
+        else:
+            default = defaults[index - first_default]
+        parameters.append((names[index], kind, default))
+    index = num_positional + num_keyword_only
+    if code.co_flags & inspect.CO_VARARGS:
+        parameters.append((names[index], Parameter.VAR_POSITIONAL, Parameter.empty))
+        index += 1
+    for name in names[num_positional : num_positional + num_keyword_only]:
+        default = keyword_defaults.get(name, Parameter.empty)
+        parameters.append((name, Parameter.KEYWORD_ONLY, default))
+    if code.co_flags & inspect.CO_VARKEYWORDS:
+        parameters.append((names[index], Parameter.VAR_KEYWORD, Parameter.empty))
+    return parameters
+
+
+def _checked_type_hints(
+    func: Callable, localns: Dict[str, Any], parameters: List[Tuple[str, Any, Any]]
+) -> Dict[str, Any]:
+    # The type hints exactly as typeguard's _CallMemo resolves them (for example
+    # `*args: T` becomes `Tuple[T, ...]`), and sharing its cache.
+    type_hints = typeguard._type_hints_map.get(func)
+    if type_hints is not None:
+        return type_hints
+    hints = typeguard.get_type_hints(func, localns=localns)
+    type_hints = collections.OrderedDict()
+    for name, kind, default in parameters:
+        if name in hints:
+            annotated_type = hints[name]
+            if default is None:
+                annotated_type = Optional[annotated_type]
+            if kind == inspect.Parameter.VAR_POSITIONAL:
+                type_hints[name] = Tuple[annotated_type, ...]
+            elif kind == inspect.Parameter.VAR_KEYWORD:
+                type_hints[name] = Dict[str, annotated_type]
+            else:
+                type_hints[name] = annotated_type
+    if "return" in hints:
+        type_hints["return"] = hints["return"]
+    typeguard._type_hints_map[func] = type_hints
+    return type_hints
+
+
+class _CheckedSignature:
+    # Everything about a function decorated with `checked` that doesn't change from
+    # call to call. `signature` is only looked up if a call can't be bound without it.
+    __slots__ = (
+        "func",
+        "func_name",
+        "globals",
+        "locals",
+        "type_hints",
+        "signature",
+        "positional",
+        "keywords",
+    )
+
+    def __init__(self, func: Callable, localns: Dict[str, Any]):
+        self.func = func
+        self.func_name = typeguard.function_name(func)
+        self.globals = func.__globals__
+        self.locals = localns
+        self.signature = None
+        parameters = _parameters(func)
+        self.type_hints = _checked_type_hints(func, localns, parameters)
+        self.positional = []
+        keywords = []
+        for name, kind, _ in parameters:
+            if kind in (
+                inspect.Parameter.POSITIONAL_ONLY,
+                inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            ):
+                self.positional.append(name)
+            if kind in (
+                inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                inspect.Parameter.KEYWORD_ONLY,
+            ):
+                keywords.append(name)
+        self.keywords = frozenset(keywords)
+
+    def bind(self, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # As `inspect.Signature.bind(...).arguments`, for the common cases. Arguments
+        # that are missing are left out, and the call itself then raises the error.
+        positional = self.positional
+        if len(args) <= len(positional):
+            arguments = dict(zip(positional, args))
+            if not kwargs:
+                return arguments
+            keywords = self.keywords
+            for name in kwargs:
+                if name in arguments or name not in keywords:
+                    break
+            else:
+                arguments.update(kwargs)
+                return arguments
+        if self.signature is None:
+            self.signature = inspect.signature(self.func)
+        return self.signature.bind(*args, **kwargs).arguments
+
+
+_generator_flags = (
+    inspect.CO_GENERATOR
+    | inspect.CO_COROUTINE
+    | inspect.CO_ITERABLE_COROUTINE
+    | inspect.CO_ASYNC_GENERATOR
+)
+
+
+def checked(func: _F) -> _F:
+    """Decorator checking the arguments and return value of `func`, equivalent to
+    `typeguard.typechecked` after `jaxtyping.patch_typeguard()`, but with less overhead
+    per call.
+
+    As with `typeguard.typechecked`, decorating a class checks each of its annotated
+    methods. Generator functions and `async` functions are passed on to
+    `typeguard.typechecked`.
+    """
+    if config._disabled:
+        return func
+    if inspect.isclass(func):
+        return _checked_class(func)
+    return _checked(func, sys._getframe(1).f_locals)
+
+
+def _checked_class(cls: type) -> type:
+    # As typeguard.typechecked does for classes.
+    prefix = cls.__qualname__ + "."
+    for key, attr in cls.__dict__.items():
+        if inspect.isfunction(attr) or inspect.ismethod(attr):
+            if attr.__qualname__.startswith(prefix) and getattr(
+                attr, "__annotations__", None
+            ):
+                setattr(cls, key, _checked(attr, cls.__dict__))
+        elif inspect.isclass(attr):
+            if attr.__qualname__.startswith(prefix):
+                _checked_class(attr)
+        elif isinstance(attr, (classmethod, staticmethod)):
+            if getattr(attr.__func__, "__annotations__", None):
+                setattr(cls, key, type(attr)(_checked(attr.__func__, cls.__dict__)))
+        elif isinstance(attr, property):
+            kwargs = dict(doc=attr.__doc__)
+            for name in ("fset", "fget", "fdel"):
+                property_func = kwargs[name] = getattr(attr, name)
+                if property_func is not None and getattr(
+                    property_func, "__annotations__", None
+                ):
+                    kwargs[name] = _checked(property_func, cls.__dict__)
+            setattr(cls, key, attr.__class__(**kwargs))
+    return cls
+
+
+def _checked(func: _F, localns: Dict[str, Any]) -> _F:
+    # Everything else is put off until the first call, so that decorating is cheap
+    # even for codebases with thousands of checked functions, most of which might
+    # never be called.
+    code = getattr(func, "__code__", None)
+    if code is None:
+        # For example a functools.partial, or another decorator's wrapper.
+        python_func = inspect.unwrap(func, stop=lambda f: hasattr(f, "__code__"))
+        if not hasattr(python_func, "__code__"):
+            warnings.warn(
+                "no code associated -- not typechecking "
+                f"{typeguard.function_name(func)}"
+            )
+            return func
+        generator = (
+            inspect.isgeneratorfunction(func)
+            or inspect.iscoroutinefunction(func)
+            or inspect.isasyncgenfunction(func)
+        )
+    else:
+        generator = code.co_flags & _generator_flags
+    if generator:
+        patch_typeguard()
+        return typeguard.typechecked(func, _localns=localns)
+    signature = None
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        nonlocal signature
+        if signature is None:
+            # Two threads might both do this at once, which is harmless.
+            patch_typeguard()
+            python_func = inspect.unwrap(func, stop=lambda f: hasattr(f, "__code__"))
+            signature = _CheckedSignature(python_func, localns)
+        memo = _CheckedMemo(signature, signature.bind(args, kwargs))
+        plan = _get_plan(memo)
+        _check_plan_arguments(plan, memo)
+        retval = func(*args, **kwargs)
+        try:
+            _check_plan_return(plan, retval, memo)
+        except TypeError as exc:  # suppress long traceback
+            raise TypeError(*exc.args) from None
+        return retval
+
+    return wrapper